@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import binascii
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+"""
+Pool of pre-generated RSA keys - worker processes fill pool files (one per key size, one hex encoded DER key
+per line) in background, take_key() pops a ready key in milliseconds
+Pool files are guarded with a lock file, so generator service and certificate generators can share them
+Pool directory and files are readable by the owner only, taken and missed keys are counted in a JSON file
+next to every pool file, so the service reports what all consumers did
+"""
+
+DEFAULT_POOL_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "keypool")
+DEFAULT_TARGET = 20
+DEFAULT_LOW_WATERMARK = 5
+
+
+@contextmanager
+def locked(path):
+    """
+    Exclusive lock of path (held on path + '.lock') for the time of with block
+    """
+    with open(path + ".lock", "a+") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def generate_key(bits):
+    """
+    Returns hex string of DER encoded new RSA private key - task of a worker process
+    :param bits: size of the key
+    """
+    from Crypto.PublicKey import RSA
+    from Crypto import Random
+
+    key = RSA.generate(bits, Random.new().read)
+    return binascii.hexlify(key.exportKey('DER')).decode('ascii')
+
+
+class KeyPool:
+    """
+    Pool files of RSA keys in a directory, with refill and low watermark metrics
+    """
+    def __init__(self, directory=DEFAULT_POOL_DIRECTORY, targets=None, low_watermark=DEFAULT_LOW_WATERMARK,
+                 workers=None):
+        """
+        :param directory: directory of pool files, created readable by the owner only - an existing one must not be
+            accessible to other users
+        :param targets: dict {key size: number of keys to keep in pool}
+        :param low_watermark: pool is refilled to target when it has this many keys or less
+        :param workers: number of processes generating keys (default - number of cpus)
+        """
+        self.directory = directory
+        self.targets = targets or {}
+        self.low_watermark = low_watermark
+        self.workers = workers or os.cpu_count() or 1
+        self.metrics = {"generated": 0, "refills": 0}
+        try:
+            os.makedirs(directory, mode=0o700)
+        except FileExistsError:
+            # permissions of an existing directory are not changed - it may be shared, or the current one
+            if fcntl is not None and os.stat(directory).st_mode & 0o077:
+                raise PermissionError("pool directory %s is accessible to other users, pooled private keys would "
+                                      "leak - chmod 700 it or use another directory" % directory)
+
+    def path(self, bits):
+        return os.path.join(self.directory, "rsa-%d.pool" % bits)
+
+    def counters_path(self, bits):
+        return self.path(bits) + ".counters"
+
+    def _replace(self, path, data):
+        """
+        Atomically replaces path with data - written to a temporary file in the pool directory (owner only)
+        and synced first, so a crash leaves either the old or the new content
+        """
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=os.path.basename(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def _read_counters(self, bits):
+        try:
+            with open(self.counters_path(bits), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"taken": 0, "misses": 0}
+
+    def level(self, bits):
+        """
+        Returns number of keys of given size in the pool
+        """
+        path = self.path(bits)
+        with locked(path):
+            if not os.path.exists(path):
+                return 0
+            with open(path, "r") as f:
+                return sum(1 for line in f if line.strip())
+
+    def put(self, bits, key_hex):
+        """
+        Appends hex encoded DER key to the pool file
+        """
+        path = self.path(bits)
+        with locked(path):
+            with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600), "a") as f:
+                f.write(key_hex + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def take(self, bits):
+        """
+        Returns RSA private key (Crypto.PublicKey.RSA) of given size removed from the pool, None if pool is empty
+        :param bits: size of the key
+        """
+        path = self.path(bits)
+        with locked(path):
+            key_hex = None
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    keys = [line.strip() for line in f if line.strip()]
+                if keys:
+                    key_hex = keys.pop()
+                    self._replace(path, "".join(key + "\n" for key in keys))
+            counters = self._read_counters(bits)
+            counters["misses" if key_hex is None else "taken"] += 1
+            self._replace(self.counters_path(bits), json.dumps(counters))
+        if key_hex is None:
+            return None
+
+        from Crypto.PublicKey import RSA
+        return RSA.importKey(binascii.unhexlify(key_hex))
+
+    def fill(self, bits, count):
+        """
+        Generates count keys of given size in worker processes, every key is added to pool as soon as it is ready
+        """
+        if count <= 0:
+            return
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(min(self.workers, count)) as executor:
+            for task in as_completed([executor.submit(generate_key, bits) for _ in range(count)]):
+                self.put(bits, task.result())
+                self.metrics["generated"] += 1
+
+    def refill(self):
+        """
+        Refills to target every pool at or below low watermark, returns {key size: number of generated keys}
+        """
+        generated = {}
+        for bits, target in self.targets.items():
+            level = self.level(bits)
+            if level <= self.low_watermark and level < target:
+                self.metrics["refills"] += 1
+                self.fill(bits, target - level)
+                generated[bits] = target - level
+        return generated
+
+    def stats(self):
+        """
+        Returns counters and pools: {key size: level, target, low watermark, whether level is below it and keys
+        taken and missed by all consumers}, taken and misses are totals of pools
+        """
+        stats = dict(self.metrics, taken=0, misses=0, pools={})
+        for bits, target in self.targets.items():
+            level = self.level(bits)
+            with locked(self.path(bits)):
+                counters = self._read_counters(bits)
+            stats["pools"][bits] = dict(counters, level=level, target=target, low_watermark=self.low_watermark,
+                                        below_low_watermark=level <= self.low_watermark)
+            stats["taken"] += counters["taken"]
+            stats["misses"] += counters["misses"]
+        return stats
+
+    def serve(self, interval=5.0):
+        """
+        Keeps refilling pools, checks levels every interval seconds
+        """
+        while True:
+            generated = self.refill()
+            if generated:
+                print("Generated keys: %s, stats: %s" % (generated, self.stats()))
+            time.sleep(interval)
+
+
+def take_key(bits, directory=DEFAULT_POOL_DIRECTORY):
+    """
+    Returns ready RSA private key of given size from the pool, None if pool is empty
+    :param bits: size of the key
+    :param directory: directory of pool files
+    """
+    return KeyPool(directory).take(bits)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate RSA keys into pool files")
+    parser.add_argument('--size', type=int, action='append', help='key size to keep in pool (repeatable)')
+    parser.add_argument('--target', type=int, default=DEFAULT_TARGET, help='number of keys to keep per size')
+    parser.add_argument('--low-watermark', type=int, default=DEFAULT_LOW_WATERMARK,
+                        help='refill when pool has this many keys or less')
+    parser.add_argument('--workers', type=int, default=None, help='number of generating processes')
+    parser.add_argument('--directory', default=DEFAULT_POOL_DIRECTORY, help='directory of pool files')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between pool level checks')
+    parser.add_argument('--once', action='store_true', help='refill once and exit')
+    args = parser.parse_args(argv)
+
+    targets = {bits: args.target for bits in (args.size or [4096])}
+    pool = KeyPool(args.directory, targets, args.low_watermark, args.workers)
+    if args.once:
+        pool.refill()
+        print(pool.stats())
+    else:
+        pool.serve(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
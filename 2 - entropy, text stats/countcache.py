@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import mmap
+import time
+import array
+import struct
+import hashlib
+
+"""
+Persistent cache of n-gram count tables of files - an entry is keyed by blake2b hash of file content and
+by analysis options (case, whitespace, skip, n values), size and mtime of the file are checked first,
+so unchanged files are not even read
+A file which grew by appending (old content is its prefix, old content ended with a whitespace) is counted
+only from the old end, counts are merged with the cached ones
+Least recently used entries are removed when the cache grows over its size limit
+Index has an entry for every (path, options) - files of the same content share one table file, which is removed
+with the last entry using it
+
+Table file: CACHE_MAGIC, metadata JSON length (uint32), metadata JSON, then for every n (8 bytes aligned)
+counts of sorted n-grams (little endian uint64) and UTF-8 of all the n-grams concatenated - all n-grams
+of a table have the same number of characters (n, 2n hex digits of byte n-grams), so counts can be used
+straight from mmap and n-grams are decoded at once
+"""
+
+"""first bytes of a table file"""
+CACHE_MAGIC = b'NGC\x02'
+
+"""default limit of bytes of all table files"""
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+"""name of index file in cache directory"""
+INDEX_NAME = 'index.json'
+
+"""bytes hashed at once"""
+HASH_BLOCK = 1024 * 1024
+
+"""bytes after which a file can be split without changing its counts, see fileStats.segment_bounds"""
+WHITESPACE_BYTES = b' \n\r\t'
+
+
+def options_key(ns, case_sensitive, skip_whitespace, skip, byte_mode=False):
+    """
+    Returns key of analysis options - counts of the same file with the same options are the same
+    """
+    options = [list(ns), case_sensitive, skip_whitespace, skip] + (['bytes'] if byte_mode else [])
+    options = json.dumps(options)
+    return hashlib.blake2b(options.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def hash_file(filename, prefix=None):
+    """
+    Returns (hash of content, hash of first prefix bytes or None) - one pass over the file
+    """
+    content = hashlib.blake2b(digest_size=16)
+    prefix_hash = None
+    position = 0
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(HASH_BLOCK)
+            if not data:
+                break
+            if prefix is not None and position <= prefix < position + len(data):
+                content.update(data[:prefix - position])
+                prefix_hash = content.hexdigest()
+                data = data[prefix - position:]
+                position = prefix
+            content.update(data)
+            position += len(data)
+    if prefix is not None and prefix == position:
+        prefix_hash = content.hexdigest()
+    return content.hexdigest(), prefix_hash
+
+
+def _pad(length):
+    return -length % 8
+
+
+def write_table(filename, ns, dictionaries, letters_counts, head, tail, length):
+    """
+    Writes count table (fields of fileStats.CountTable) to filename, see module description
+    """
+    tables = []
+    blobs = []
+    for n, dictionary in zip(ns, dictionaries):
+        keys = sorted(dictionary)
+        counts = array.array('Q', [dictionary[key] for key in keys])
+        if sys.byteorder != 'little':
+            counts.byteswap()
+        text = ''.join(keys).encode('utf-8')
+        width = len(keys[0]) if keys else n
+        tables.append({"n": n, "width": width, "count": len(keys), "keys_bytes": len(text)})
+        blobs.append((counts.tobytes(), text))
+    meta = json.dumps({"ns": list(ns), "letters_counts": list(letters_counts), "head": head, "tail": tail,
+                       "length": length, "tables": tables}).encode('utf-8')
+    with open(filename, 'wb') as f:
+        header = CACHE_MAGIC + struct.pack('<I', len(meta)) + meta
+        f.write(header + b'\0' * _pad(len(header)))
+        for counts, text in blobs:
+            f.write(counts + text + b'\0' * _pad(len(text)))
+
+
+def read_table(filename):
+    """
+    Returns dict of CountTable fields (ns, dictionaries, letters_counts, head, tail, length) read from filename
+    """
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+            raise ValueError("not a count table file: " + filename)
+        meta_length, = struct.unpack_from('<I', data, len(CACHE_MAGIC))
+        position = len(CACHE_MAGIC) + 4
+        meta = json.loads(data[position:position + meta_length].decode('utf-8'))
+        position += meta_length
+        position += _pad(position)
+        dictionaries = []
+        for table in meta["tables"]:
+            width, count = table["width"], table["count"]
+            if sys.byteorder == 'little':
+                with memoryview(data)[position:position + 8 * count] as view, view.cast('Q') as values:
+                    counts = values.tolist()
+            else:
+                counts = array.array('Q', data[position:position + 8 * count])
+                counts.byteswap()
+            position += 8 * count
+            text = data[position:position + table["keys_bytes"]].decode('utf-8')
+            position += table["keys_bytes"] + _pad(table["keys_bytes"])
+            dictionaries.append({text[i * width:(i + 1) * width]: c for i, c in enumerate(counts)} if width else {})
+    return {"ns": meta["ns"], "dictionaries": dictionaries, "letters_counts": meta["letters_counts"],
+            "head": meta["head"], "tail": meta["tail"], "length": meta["length"]}
+
+
+class CountCache:
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE):
+        """
+        :param directory: directory of table files and index (created if missing)
+        :param max_bytes: limit of bytes of all table files
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, INDEX_NAME)) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        # (path, options key) -> (stat, content hash) of files looked up, for store
+        self.pending = {}
+
+    def _path(self, table):
+        return os.path.join(self.directory, table + '.ngc')
+
+    def _table(self, name):
+        # entries of older indexes are named after their table
+        return self.entries[name].get("table", name)
+
+    def _find(self, **fields):
+        return next((name for name, entry in self.entries.items()
+                     if all(entry[k] == v for k, v in fields.items())), None)
+
+    def _load(self, name):
+        entry = self.entries[name]
+        table = self._table(name)
+        try:
+            fields = read_table(self._path(table))
+        except (OSError, ValueError):
+            for other in [other for other in self.entries if self._table(other) == table]:
+                del self.entries[other]
+            return None
+        entry["last_used"] = time.time()
+        return fields
+
+    def lookup(self, filename, key, incremental=True):
+        """
+        Returns (fields, start) - cached CountTable fields of file (or None) and offset from which the file
+        has to be counted and merged with them (None - cached counts are complete)
+        :param filename: counted file
+        :param key: options_key of analysis options
+        :param incremental: counts of appended text can be merged with cached ones (see fileStats.can_split)
+        """
+        path = os.path.abspath(filename)
+        stat = os.stat(filename)
+        name = self._find(path=path, options=key)
+        entry = self.entries.get(name)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            fields = self._load(name)
+            if fields is not None:
+                return fields, None
+            entry = None
+
+        appended = (incremental and entry is not None and entry["appendable"]
+                    and 0 < entry["size"] < stat.st_size)
+        content, prefix = hash_file(filename, entry["size"] if appended else None)
+        self.pending[(path, key)] = (stat, content)
+
+        same = self._find(hash=content, options=key)
+        if same is not None:
+            fields = self._load(same)
+            if fields is not None:
+                # the same content under another path (or older entry of this one) - path is indexed too,
+                # so the next lookup of an unchanged file does not hash it
+                self._index(filename, key, self._table(same))
+                return fields, None
+        if appended and name in self.entries and prefix == entry["hash"]:
+            fields = self._load(name)
+            if fields is not None:
+                return fields, entry["size"]
+        return None, 0
+
+    def store(self, filename, key, fields):
+        """
+        Stores counts (CountTable fields) of file looked up before, replacing its older entry
+        """
+        _, content = self.pending[(os.path.abspath(filename), key)]
+        table = hashlib.blake2b((content + key).encode('ascii'), digest_size=16).hexdigest()
+        temporary = self._path(table) + '.tmp'
+        write_table(temporary, fields["ns"], fields["dictionaries"], fields["letters_counts"], fields["head"],
+                    fields["tail"], fields["length"])
+        os.replace(temporary, self._path(table))
+        self._index(filename, key, table)
+
+    def _index(self, filename, key, table):
+        """
+        Adds entry of file looked up before with counts in table file, replacing its older entry
+        """
+        path = os.path.abspath(filename)
+        stat, content = self.pending.pop((path, key))
+        name = hashlib.blake2b((path + '\0' + key).encode('utf-8'), digest_size=16).hexdigest()
+        old = self._find(path=path, options=key)
+        old_table = self._table(old) if old is not None else None
+        with open(filename, 'rb') as f:
+            f.seek(max(0, stat.st_size - 1))
+            last = f.read(1)
+        if old is not None:
+            del self.entries[old]
+        self.entries[name] = {"path": path, "options": key, "size": stat.st_size, "mtime": stat.st_mtime_ns,
+                              "hash": content, "appendable": last in WHITESPACE_BYTES, "table": table,
+                              "bytes": os.path.getsize(self._path(table)), "last_used": time.time()}
+        if old_table is not None:
+            self._release(old_table)
+
+    def _remove(self, name):
+        """
+        Removes entry, and its table file if no other entry uses it
+        Returns if the table file was removed
+        """
+        table = self._table(name)
+        del self.entries[name]
+        return self._release(table)
+
+    def _release(self, table):
+        """
+        Removes table file if no entry uses it, returns if it was removed
+        """
+        if any(self._table(name) == table for name in self.entries):
+            return False
+        try:
+            os.remove(self._path(table))
+        except OSError:
+            pass
+        return True
+
+    def evict(self):
+        """
+        Removes least recently used entries until table files take at most max_bytes
+        """
+        tables = {self._table(name): entry["bytes"] for name, entry in self.entries.items()}
+        total = sum(tables.values())
+        for name in sorted(self.entries, key=lambda name: self.entries[name]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            table = self._table(name)
+            if self._remove(name):
+                total -= tables[table]
+
+    def save(self):
+        """
+        Evicts entries over the size limit and writes the index
+        """
+        self.evict()
+        temporary = os.path.join(self.directory, INDEX_NAME + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(temporary, os.path.join(self.directory, INDEX_NAME))
@@ -1,11 +1,69 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import argparse
+import os
+import io
 import sys
+import csv
+import json
 import codecs
+import heapq
+import collections
 import math
+import struct
+import timeit
+import sketches
+import countcache
 from time import gmtime, strftime
 
+"""bytes read from analyzed file at once - memory is bounded by chunk size and n-gram count tables"""
+CHUNK_SIZE = 1024 * 1024
+
+"""bytes read at once with --approximate - exact counts of a chunk are kept until they are added to sketches"""
+SKETCH_CHUNK_SIZE = 256 * 1024
+
+"""characters removed by --whitespace"""
+WHITESPACES = ' \n\r\t'
+
+"""longest word held back between chunks when lower casing - longer ones are lower cased without their end"""
+WORD_CARRY_LIMIT = 4096
+
+"""n-gram counting engines: dict - substring per position, numpy - vectorized, suffix - one suffix array
+for all n (numpy and suffix need numpy installed)"""
+ENGINES = ['dict', 'numpy', 'suffix']
+
+"""numpy engine counts n-grams with bincount when there are at most this many possible keys, else with np.unique"""
+BINCOUNT_LIMIT = 1 << 22
+
+"""bytes of one piece of a large file counted by one worker process in --jobs mode"""
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+"""bytes searched for a whitespace to split file at - pieces of text without whitespace are not split"""
+BOUNDARY_SEARCH = 64 * 1024
+
+"""first bytes of --format binary report"""
+BINARY_MAGIC = b'NGRS\x01'
+
+"""bytes of memory mapped file counted at once by --bytes - temporary arrays of a block stay in cpu cache"""
+BYTE_BLOCK = 1024 * 1024
+
+"""n-grams decoded from suffix array at once"""
+DECODE_BATCH = 64 * 1024
+
+
+def parse_ngrams(value):
+    """
+    Returns list of n-gram lengths given as 'n' or range 'first-last'
+    """
+    first, _, last = value.partition('-')
+    try:
+        first, last = int(first), int(last or first)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid n-gram range: " + value)
+    if not 1 <= first <= last:
+        raise argparse.ArgumentTypeError("invalid n-gram range: " + value)
+    return list(range(first, last + 1))
+
 
 class Parser(argparse.ArgumentParser):
     def init_parameters(self):
@@ -19,6 +77,43 @@ class Parser(argparse.ArgumentParser):
         self.add_argument('--precision', default=3, help='entropy algorithm precision',
                           type=int)
         self.add_argument('--skip', default='', help='skip certain sign in statistics')
+        self.add_argument('--chunk-size', default=None, type=int,
+                          help='bytes read from file at once (default %d, %d with --approximate)'
+                               % (CHUNK_SIZE, SKETCH_CHUNK_SIZE))
+        self.add_argument('--engine', default=None, choices=ENGINES,
+                          help='n-gram counting engine (default dict, suffix with --ngrams)')
+        self.add_argument('--ngrams', default=None, type=parse_ngrams,
+                          help='range of n-gram lengths, eg. 1-16 (default 1, 2, 3)')
+        self.add_argument('--compare-engines', action='store_true',
+                          help='count with every engine, print throughput and whether counts are equal')
+        self.add_argument('--jobs', default=1, help='worker processes counting files and pieces of large files',
+                          type=int)
+        self.add_argument('--segment-size', default=SEGMENT_SIZE, help='bytes of one piece of a large file',
+                          type=int)
+        self.add_argument('--aggregate', action='store_true',
+                          help='add statistics of all files together (corpus) to the report')
+        self.add_argument('--format', default='text', help='report format', choices=sorted(REPORT_FORMATS))
+        self.add_argument('--top', default=None, help='list only K most frequent n-grams of every n', type=int)
+        self.add_argument('--approximate', action='store_true',
+                          help='estimate counts of most frequent n-grams, number of different n-grams and entropy '
+                               'with sketches of bounded memory')
+        self.add_argument('--check-exact', action='store_true',
+                          help='with --approximate count exactly too and report exact values next to estimates')
+        self.add_argument('--bytes', action='store_true',
+                          help='count byte n-grams of any (binary) file, memory mapped - n-grams are written in hex, '
+                               'text options (case, whitespace, skip, engine) are not used')
+        self.add_argument('--window', default=None, type=int,
+                          help='write entropy profile - entropy of windows of WINDOW symbols (characters, bytes '
+                               'with --bytes) instead of n-gram statistics')
+        self.add_argument('--step', default=None, type=int,
+                          help='symbols between starts of neighbouring profile windows (default - window)')
+        self.add_argument('--threshold', default=None, type=float,
+                          help='write only profile windows with entropy of at least THRESHOLD')
+        self.add_argument('--cache', default=None,
+                          help='directory of cached counts - unchanged files are not counted again, appended '
+                               'files only from their old end')
+        self.add_argument('--cache-size', default=countcache.DEFAULT_CACHE_SIZE // (1024 * 1024), type=int,
+                          help='limit of cached counts in MB, least recently used are removed')
 
     def error(self, message):
         sys.stderr.write('error: %s\n' % message)
@@ -26,12 +121,60 @@ class Parser(argparse.ArgumentParser):
         sys.exit(2)
 
 
+def format_ngram(key, count, letters_count, precision):
+    """
+    Returns text report line of n-gram: 'key': count(percent%), with escaped control characters
+    """
+    bufkey = key
+    if '\n' in key:
+        bufkey = bufkey.replace('\n', '\\n')
+    if '\t' in key:
+        bufkey = bufkey.replace('\t', '\\t')
+    if '\r' in key:
+        bufkey = bufkey.replace('\r', '\\r')
+
+    return "'" + bufkey + "'" + ": " + str(count) + "(" \
+           + str(round(frequency(count, letters_count) * 100, precision)) + "%)"
+
+
+def frequency(count, letters_count):
+    """
+    Returns count / letters_count, 0 for a text without n-grams
+    """
+    return count / letters_count if letters_count else 0
+
+
+def entropy_ratios(n_gram):
+    """
+    Returns (entropy normalized by length of the text, entropy in %) of n_gram, None when the text is shorter
+    than n (no n-grams)
+    """
+    if not n_gram.letters_count:
+        return None
+    normalized = n_gram.entropy / n_gram.letters_count
+    return normalized, (1 - normalized) * 100
+
+
 class FileStats:
+    """
+    Text report written incrementally to STATS_<date> file - Entropy.write_statistics calls begin_ngram,
+    write_ngram for every listed n-gram and end_ngram for every n
+    Subclasses write the same events in other formats
+    """
+    extension = ""
+
     def __init__(self, filenames, case_sensitive, skip_whitespace, logbase, precision):
         date_and_time_filename = str(strftime("%Y-%m-%d_%H-%M-%S", gmtime()))
         date_and_time = str(strftime("%Y-%m-%d %H:%M:%S", gmtime()))
-        self.filename = "STATS_" + date_and_time_filename
-        self.file = codecs.open(self.filename, 'w', 'utf-8')
+        self.filename = "STATS_" + date_and_time_filename + self.extension
+        self.precision = precision
+        self.file = self.open()
+        self.write_header(date_and_time, filenames, case_sensitive, skip_whitespace, logbase, precision)
+
+    def open(self):
+        return codecs.open(self.filename, 'w', 'utf-8')
+
+    def write_header(self, date_and_time, filenames, case_sensitive, skip_whitespace, logbase, precision):
         self.write_line("Analysis date and time: " + date_and_time)
         self.write_line("Filenames analyzed: ")
         for filename in filenames:
@@ -49,41 +192,732 @@ class FileStats:
     def write_break_line(self):
         self.write_line("--------------------------------------------------------")
 
+    def begin_file(self, filename):
+        self.write_line("Name of the file: " + filename)
+
+    def begin_aggregate(self, files_count):
+        self.write_line("Aggregate of all files (" + str(files_count) + ")")
+
+    def end_file(self):
+        self.write_line("")
+        self.write_break_line()
+
+    def begin_ngram(self, n_gram):
+        self.write_line("NGram n: " + str(n_gram.n))
+        self.write_line("Letters count: " + str(n_gram.letters_count))
+        self.write_line("Number of different chars: " + str(n_gram.different_letters_count))
+        self.write_line("<-->")
+
+    def write_ngram(self, n_gram, key, count):
+        self.write_line(format_ngram(key, count, n_gram.letters_count, self.precision))
+
+    def end_ngram(self, n_gram):
+        normalized, percent = entropy_ratios(n_gram) or (0, 0)
+        self.write_line("<-->")
+        self.write_line("Entropy of the text: " + str(n_gram.entropy))
+        self.write_line("Entropy normalized by length of the text: " + str(normalized))
+        self.write_line("Entropy in %: " + str(percent) + "%")
+        self.write_line("----------")
+
+    def write_estimate(self, n_gram, estimate):
+        """
+        Writes estimates of sketches of n_gram, see NGramSketch.summary
+        """
+        different = "\tDifferent n-grams: " + str(estimate["different_count"]) + " (+-" \
+                    + str(round(estimate["different_count_error"] * 100, self.precision)) + "%)"
+        entropy = "\tEntropy: " + str(estimate["entropy"]) + " (+-" \
+                  + str(round(estimate["entropy_error"], self.precision)) + ")"
+        if estimate["exact_different_count"] is not None:
+            different += ", exact: " + str(estimate["exact_different_count"])
+        if estimate["exact_entropy"] is not None:
+            entropy += ", exact: " + str(estimate["exact_entropy"])
+        self.write_line("Approximate counts (sketch memory: " + str(estimate["memory"]) + " bytes):")
+        self.write_line(different)
+        self.write_line(entropy)
+        self.write_line("\tCounts overestimated by at most " + str(estimate["count_error"]) + " with probability "
+                        + str(round(estimate["count_confidence"] * 100, self.precision)) + "%")
+        self.write_line("----------")
+
+    def begin_profile(self, window, step):
+        self.write_line("Entropy of windows of " + str(window) + " symbols, every " + str(step) + " symbols:")
+
+    def write_window(self, offset, size, entropy):
+        """
+        Writes entropy of window of size symbols starting at offset, see entropy_profile
+        """
+        self.write_line(str(offset) + "\t" + str(entropy))
+
     def close(self):
         self.file.close()
 
 
+class StringStats(FileStats):
+    """
+    Text report of statistics kept in memory, see Entropy.return_statistics_as_string
+    """
+    def __init__(self, precision):
+        self.filename = None
+        self.precision = precision
+        self.file = io.StringIO()
+
+    def getvalue(self):
+        return self.file.getvalue()
+
+
+class JsonLinesStats(FileStats):
+    """
+    Report in JSON Lines - one object per line: header, file, aggregate, table (n-gram length and counts),
+    ngram (for every listed n-gram) and entropy records, told apart by "type"
+    """
+    extension = ".jsonl"
+
+    def open(self):
+        return open(self.filename, 'w', encoding='utf-8')
+
+    def write_record(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def write_header(self, date_and_time, filenames, case_sensitive, skip_whitespace, logbase, precision):
+        self.write_record({"type": "header", "date": date_and_time, "filenames": list(filenames),
+                           "case_sensitive": case_sensitive, "skip_whitespace": skip_whitespace,
+                           "logarithm_base": logbase, "precision": precision})
+
+    def begin_file(self, filename):
+        self.write_record({"type": "file", "name": filename})
+
+    def begin_aggregate(self, files_count):
+        self.write_record({"type": "aggregate", "files": files_count})
+
+    def end_file(self):
+        pass
+
+    def begin_ngram(self, n_gram):
+        self.write_record({"type": "table", "n": n_gram.n, "letters_count": n_gram.letters_count,
+                           "different_count": n_gram.different_letters_count})
+
+    def write_ngram(self, n_gram, key, count):
+        self.write_record({"type": "ngram", "n": n_gram.n, "ngram": key, "count": count,
+                           "frequency": frequency(count, n_gram.letters_count)})
+
+    def end_ngram(self, n_gram):
+        normalized, percent = entropy_ratios(n_gram) or (0, 0)
+        self.write_record({"type": "entropy", "n": n_gram.n, "entropy": n_gram.entropy,
+                           "normalized": normalized, "percent": percent})
+
+    def write_estimate(self, n_gram, estimate):
+        self.write_record(dict({"type": "estimate"}, **estimate))
+
+    def begin_profile(self, window, step):
+        self.write_record({"type": "profile", "window": window, "step": step})
+
+    def write_window(self, offset, size, entropy):
+        self.write_record({"type": "window", "offset": offset, "size": size, "entropy": entropy})
+
+
+class CsvStats(FileStats):
+    """
+    Report in CSV - ngram rows (one per listed n-gram), summary rows (counts and entropy of every n) and
+    estimate rows (--approximate) of every file, file column is empty for corpus aggregate
+    With --window window rows - offset, number of symbols (letters_count) and entropy of every window
+    """
+    extension = ".csv"
+    columns = ["type", "file", "n", "ngram", "count", "frequency", "letters_count", "different_count", "entropy",
+               "entropy_normalized", "entropy_percent", "memory", "different_count_error", "entropy_error",
+               "count_error", "exact_different_count", "exact_entropy", "offset"]
+
+    def open(self):
+        return open(self.filename, 'w', encoding='utf-8', newline='')
+
+    def write_header(self, date_and_time, filenames, case_sensitive, skip_whitespace, logbase, precision):
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+        self.current = ""
+
+    def begin_file(self, filename):
+        self.current = filename
+
+    def begin_aggregate(self, files_count):
+        self.current = ""
+
+    def end_file(self):
+        pass
+
+    def begin_ngram(self, n_gram):
+        pass
+
+    def write_ngram(self, n_gram, key, count):
+        self.writer.writerow(["ngram", self.current, n_gram.n, key, count, frequency(count, n_gram.letters_count)]
+                             + [""] * 12)
+
+    def end_ngram(self, n_gram):
+        # empty normalized and percent fields of a text without n-grams
+        ratios = entropy_ratios(n_gram) or ("", "")
+        self.writer.writerow(["summary", self.current, n_gram.n, "", "", "", n_gram.letters_count,
+                              n_gram.different_letters_count, n_gram.entropy] + list(ratios) + [""] * 7)
+
+    def write_estimate(self, n_gram, estimate):
+        exact = [estimate["exact_different_count"], estimate["exact_entropy"]]
+        self.writer.writerow(["estimate", self.current, n_gram.n, "", "", "", estimate["letters_count"],
+                              estimate["different_count"], estimate["entropy"], "", "", estimate["memory"],
+                              estimate["different_count_error"], estimate["entropy_error"], estimate["count_error"]]
+                             + ["" if value is None else value for value in exact] + [""])
+
+    def begin_profile(self, window, step):
+        pass
+
+    def write_window(self, offset, size, entropy):
+        self.writer.writerow(["window", self.current, "", "", "", "", size, "", entropy] + [""] * 8 + [offset])
+
+
+class BinaryStats(FileStats):
+    """
+    Compact binary report - BINARY_MAGIC, then records of one tag byte and little endian fields:
+        H - header: JSON length (uint32), JSON of analysis options
+        F - file: name length (uint32), UTF-8 name
+        A - aggregate: number of files (uint32)
+        T - table: n (uint16), letters count (uint64), different count (uint64)
+        G - n-gram: UTF-8 length (uint16), UTF-8 n-gram, count (uint64)
+        E - entropy of the table (float64)
+        S - estimate of --approximate: JSON length (uint32), JSON of NGramSketch.summary
+        P - entropy profile (--window): window (uint64), step (uint64)
+        W - window of profile: offset (uint64), number of symbols (uint64), entropy (float64)
+    See read_binary_stats
+    """
+    extension = ".bin"
+
+    def open(self):
+        return open(self.filename, 'wb')
+
+    def write_header(self, date_and_time, filenames, case_sensitive, skip_whitespace, logbase, precision):
+        header = json.dumps({"date": date_and_time, "filenames": list(filenames), "case_sensitive": case_sensitive,
+                             "skip_whitespace": skip_whitespace, "logarithm_base": logbase,
+                             "precision": precision}).encode('utf-8')
+        self.file.write(BINARY_MAGIC + b'H' + struct.pack('<I', len(header)) + header)
+
+    def begin_file(self, filename):
+        name = filename.encode('utf-8')
+        self.file.write(b'F' + struct.pack('<I', len(name)) + name)
+
+    def begin_aggregate(self, files_count):
+        self.file.write(b'A' + struct.pack('<I', files_count))
+
+    def end_file(self):
+        pass
+
+    def begin_ngram(self, n_gram):
+        self.file.write(b'T' + struct.pack('<HQQ', n_gram.n, n_gram.letters_count, n_gram.different_letters_count))
+
+    def write_ngram(self, n_gram, key, count):
+        key = key.encode('utf-8')
+        self.file.write(b'G' + struct.pack('<H', len(key)) + key + struct.pack('<Q', count))
+
+    def end_ngram(self, n_gram):
+        self.file.write(b'E' + struct.pack('<d', n_gram.entropy))
+
+    def write_estimate(self, n_gram, estimate):
+        data = json.dumps(estimate).encode('utf-8')
+        self.file.write(b'S' + struct.pack('<I', len(data)) + data)
+
+    def begin_profile(self, window, step):
+        self.file.write(b'P' + struct.pack('<QQ', window, step))
+
+    def write_window(self, offset, size, entropy):
+        self.file.write(b'W' + struct.pack('<QQd', offset, size, entropy))
+
+
+def read_binary_stats(filename):
+    """
+    Yields records of binary report as tuples: ('H', options dict), ('F', name), ('A', files count),
+    ('T', n, letters count, different count), ('G', n-gram, count), ('E', entropy), ('S', estimate dict),
+    ('P', window, step), ('W', offset, number of symbols, entropy)
+    """
+    with open(filename, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError("not a binary statistics file: " + filename)
+        while True:
+            tag = f.read(1)
+            if not tag:
+                return
+            if tag in (b'H', b'S'):
+                length, = struct.unpack('<I', f.read(4))
+                yield tag.decode('ascii'), json.loads(f.read(length).decode('utf-8'))
+            elif tag == b'F':
+                length, = struct.unpack('<I', f.read(4))
+                yield 'F', f.read(length).decode('utf-8')
+            elif tag == b'A':
+                yield ('A',) + struct.unpack('<I', f.read(4))
+            elif tag == b'T':
+                yield ('T',) + struct.unpack('<HQQ', f.read(18))
+            elif tag == b'G':
+                length, = struct.unpack('<H', f.read(2))
+                key = f.read(length).decode('utf-8')
+                yield ('G', key) + struct.unpack('<Q', f.read(8))
+            elif tag == b'E':
+                yield ('E',) + struct.unpack('<d', f.read(8))
+            elif tag == b'P':
+                yield ('P',) + struct.unpack('<QQ', f.read(16))
+            elif tag == b'W':
+                yield ('W',) + struct.unpack('<QQd', f.read(24))
+            else:
+                raise ValueError("unknown record %r in %s" % (tag, filename))
+
+
+"""report writers of --format"""
+REPORT_FORMATS = {'text': FileStats, 'jsonl': JsonLinesStats, 'csv': CsvStats, 'binary': BinaryStats}
+
+
 class NGram:
     def __init__(self, n):
         self.n = n
         self.dictionary = {}
+        # SuffixArray or ByteCounts - counts of all n kept outside of dictionary
+        self.suffix_array = None
+        self.sketch = None
         self.letters_count = 0
         self.different_letters_count = 0
         self.entropy = 0
 
     def clear(self):
-        self.n = 0
         self.dictionary = {}
+        self.suffix_array = None
+        self.sketch = None
         self.letters_count = 0
         self.different_letters_count = 0
         self.entropy = 0
 
+    def items(self):
+        """
+        Yields (n-gram, count) sorted by n-gram - from dictionary or from suffix array (byte counts)
+        """
+        if self.suffix_array is not None:
+            for item in self.suffix_array.items(self.n):
+                yield item
+        else:
+            for key in sorted(self.dictionary):
+                yield key, self.dictionary[key]
+
+    def counts(self, ordered=True):
+        """
+        Returns counts of n-grams in the order of items, without building n-gram strings
+        :param ordered: False - in any order, dictionary is not sorted
+        """
+        if self.suffix_array is not None:
+            return self.suffix_array.counts(self.n)
+        if not ordered:
+            return list(self.dictionary.values())
+        return [self.dictionary[key] for key in sorted(self.dictionary)]
+
+    def top(self, k):
+        """
+        Returns k (n-gram, count) with the highest counts, by count descending and n-gram - the order of
+        heapq.nlargest of items, without sorting all n-grams
+        """
+        if self.suffix_array is not None:
+            return self.suffix_array.top(self.n, k)
+        return heapq.nsmallest(k, self.dictionary.items(), key=lambda item: (-item[1], item[0]))
+
+
+def top_indices(counts, k):
+    """
+    Returns indices of k highest counts (numpy array) by count descending and index - partition instead of sort,
+    only the selected indices are sorted
+    """
+    import numpy as np
+
+    if k < len(counts):
+        kth = np.partition(counts, len(counts) - k)[len(counts) - k]
+        above = np.flatnonzero(counts > kth)
+        selected = np.concatenate([above, np.flatnonzero(counts == kth)[:k - len(above)]])
+    else:
+        selected = np.arange(len(counts))
+    return selected[np.lexsort((selected, -counts[selected]))]
+
+
+class SuffixArray:
+    """
+    n-gram counts of text for every n up to max_n from one structure: suffixes sorted by their first max_n
+    characters (prefix doubling, log2(max_n) sorts) and LCP array of neighbouring suffixes capped at max_n
+    n-grams of length n are runs of neighbouring suffixes with LCP >= n, in sorted order
+    Memory - a few integers per character of text, whatever the number and length of n-grams
+    """
+    def __init__(self, text, max_n):
+        import numpy as np
+
+        self.max_n = max_n
+        self.codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        length = len(self.codes)
+        # rank of every position for prefixes of length 1, 2, 4, ... - 0 stands for end of text
+        _, rank = np.unique(self.codes, return_inverse=True)
+        rank = rank.ravel().astype(np.int64) + 1
+        level = 1
+        while level < max_n:
+            following = np.zeros(length, dtype=np.int64)
+            following[:max(0, length - level)] = rank[level:]
+            _, rank = np.unique(rank * (length + 2) + following, return_inverse=True)
+            rank = rank.ravel().astype(np.int64) + 1
+            level *= 2
+        self.order = np.argsort(rank, kind='stable').astype(np.int32)
+        del rank
+
+        # LCP of neighbours - one comparison of characters per n, only for pairs equal so far
+        a, b = self.order[:-1].astype(np.int64), self.order[1:].astype(np.int64)
+        lcp = np.zeros(max(0, length - 1), dtype=np.int32)
+        equal = np.arange(len(lcp))
+        for k in range(max_n):
+            equal = equal[np.maximum(a[equal], b[equal]) + k < length]
+            equal = equal[self.codes[a[equal] + k] == self.codes[b[equal] + k]]
+            lcp[equal] += 1
+        self.lcp = np.zeros(length, dtype=np.int32)
+        self.lcp[1:] = lcp
+
+    def _runs(self, n):
+        import numpy as np
+
+        length = len(self.codes)
+        if length < n:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        boundaries = np.flatnonzero(self.lcp < n)
+        counts = np.diff(np.append(boundaries, length))
+        # suffixes shorter than n are runs of their own
+        valid = length - self.order[boundaries] >= n
+        return self.order[boundaries[valid]], counts[valid]
+
+    def count(self, n):
+        """
+        Returns number of n-grams (positions)
+        """
+        return max(0, len(self.codes) - n + 1)
+
+    def distinct(self, n):
+        """
+        Returns number of different n-grams
+        """
+        return len(self._runs(n)[0])
+
+    def counts(self, n):
+        """
+        Returns list of counts of different n-grams in sorted order
+        """
+        return self._runs(n)[1].tolist()
+
+    def items(self, n):
+        """
+        Yields (n-gram, count) in sorted order
+        """
+        import numpy as np
+
+        starts, counts = self._runs(n)
+        offsets = np.arange(n)
+        for i in range(0, len(starts), DECODE_BATCH):
+            block = self.codes[starts[i:i + DECODE_BATCH, None] + offsets]
+            text = block.tobytes().decode('utf-32-le')
+            for j, count in enumerate(counts[i:i + DECODE_BATCH].tolist()):
+                yield text[j * n:(j + 1) * n], count
+
+    def top(self, n, k):
+        """
+        Returns k (n-gram, count) with the highest counts, see NGram.top - only they are decoded
+        """
+        import numpy as np
+
+        starts, counts = self._runs(n)
+        selected = top_indices(counts, k)
+        text = self.codes[starts[selected, None] + np.arange(n)].tobytes().decode('utf-32-le')
+        return [(text[j * n:(j + 1) * n], count) for j, count in enumerate(counts[selected].tolist())]
+
+
+class ByteCounts:
+    """
+    Byte n-gram counts of binary data (numpy uint8 array, eg. view of mmap), the same interface as SuffixArray
+    n-grams are written as hex strings - n <= 2 are counted into fixed arrays of 256 and 65536 counters,
+    longer ones are packed into integers (n <= 8) or compared as raw bytes and counted by sorting
+    Data is read in blocks of BYTE_BLOCK bytes, no copy of data is made, no reference to it is kept
+    Bytes and pairs are counted with bincount of data viewed as 16-bit numbers - half the elements of bincount
+    of single bytes, byte counts are sums of pair counts
+    """
+    def __init__(self, data, ns):
+        import numpy as np
+
+        self.length = len(data)
+        self.dense = {}
+        self.sparse = {}
+        for n in ns:
+            if n == 0:
+                continue
+            if n <= 2:
+                self.dense[n] = np.zeros(256 ** n, dtype=np.int64)
+            else:
+                self.sparse[n] = None
+        max_n = max(list(self.dense) + list(self.sparse) + [1])
+        for start in range(0, self.length, BYTE_BLOCK):
+            # n-grams starting in this block
+            block = data[start:start + BYTE_BLOCK + max_n - 1]
+            size = min(BYTE_BLOCK, self.length - start)
+            if 2 in self.dense:
+                pairs = self._pairs(block, min(size, len(block) - 1))
+                self.dense[2] += pairs
+                if 1 in self.dense:
+                    self.dense[1] += pairs.reshape(256, 256).sum(axis=1)
+            elif 1 in self.dense:
+                self.dense[1] += self._bytes(block[:size])
+            for n in self.sparse:
+                if len(block) < n:
+                    continue
+                keys, counts = np.unique(self._keys(block[:size + n - 1], n), return_counts=True)
+                self.sparse[n] = self._merge(self.sparse[n], keys, counts)
+        if 1 in self.dense and 2 in self.dense and self.length:
+            # last byte begins no pair
+            self.dense[1][data[-1]] += 1
+
+    @staticmethod
+    def _bytes(block):
+        import numpy as np
+
+        even = len(block) // 2 * 2
+        pairs = np.bincount(block[:even].view('<u2'), minlength=65536).reshape(256, 256)
+        counts = pairs.sum(axis=0) + pairs.sum(axis=1)
+        if even < len(block):
+            counts[block[-1]] += 1
+        return counts
+
+    @staticmethod
+    def _pairs(block, count):
+        """
+        Returns counts of pairs starting at first count positions of block - big endian 16-bit views
+        of pairs at even and at odd positions
+        """
+        import numpy as np
+
+        if count <= 0:
+            return np.zeros(65536, dtype=np.int64)
+        even, odd = (count + 1) // 2, count // 2
+        counts = np.bincount(block[:2 * even].view('>u2'), minlength=65536)
+        if odd:
+            counts += np.bincount(block[1:1 + 2 * odd].view('>u2'), minlength=65536)
+        return counts
+
+    @staticmethod
+    def _keys(block, n):
+        import numpy as np
+
+        if n <= 8:
+            # big endian packing - integer order is the order of bytes
+            count = len(block) - n + 1
+            keys = np.zeros(count, dtype=np.uint64)
+            for j in range(n):
+                keys <<= np.uint64(8)
+                keys |= block[j:j + count]
+            return keys
+        windows = np.lib.stride_tricks.sliding_window_view(block, n)
+        return np.ascontiguousarray(windows).view(np.dtype((np.void, n))).ravel()
+
+    @staticmethod
+    def _merge(previous, keys, counts):
+        import numpy as np
+
+        if previous is None:
+            return keys, counts
+        keys = np.concatenate([previous[0], keys])
+        counts = np.concatenate([previous[1], counts])
+        order = np.argsort(keys, kind='stable')
+        keys, counts = keys[order], counts[order]
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        return keys[starts], np.add.reduceat(counts, starts)
+
+    def _nonzero(self, n):
+        import numpy as np
+
+        if n in self.dense:
+            keys = np.flatnonzero(self.dense[n])
+            return keys, self.dense[n][keys]
+        if self.sparse[n] is None:
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+        return self.sparse[n]
+
+    def count(self, n):
+        """
+        Returns number of n-grams (positions)
+        """
+        return max(0, self.length - n + 1)
+
+    def distinct(self, n):
+        """
+        Returns number of different n-grams
+        """
+        return len(self._nonzero(n)[0])
+
+    def counts(self, n):
+        """
+        Returns list of counts of different n-grams in sorted order
+        """
+        return self._nonzero(n)[1].tolist()
+
+    def items(self, n):
+        """
+        Yields (n-gram as hex string, count) in sorted order
+        """
+        keys, counts = self._nonzero(n)
+        for key, count in zip(self._hex(keys, n), counts.tolist()):
+            yield key, count
+
+    def top(self, n, k):
+        """
+        Returns k (n-gram as hex string, count) with the highest counts, see NGram.top
+        """
+        keys, counts = self._nonzero(n)
+        selected = top_indices(counts, k)
+        return list(zip(self._hex(keys[selected], n), counts[selected].tolist()))
+
+    @staticmethod
+    def _hex(keys, n):
+        if n > 8:
+            return [bytes(key).hex() for key in keys]
+        return ['%0*x' % (2 * n, key) for key in keys.tolist()]
+
+
+class CountTable:
+    """
+    Mergeable n-gram counts of a piece of text - besides counts it keeps first and last (max n - 1) characters
+    and length of the text, so n-grams crossing the border of adjacent pieces are counted when tables are merged
+    Merging is associative: pieces of a file can be counted in any grouping, in separate processes
+    With --approximate counts are kept in sketches (NGramSketch), dictionaries are empty unless exact
+    """
+    def __init__(self, ns, dictionaries=None, letters_counts=None, head="", tail="", length=0, suffix_array=None,
+                 sketches=None, exact=True):
+        self.ns = ns
+        self.dictionaries = dictionaries if dictionaries is not None else [{} for _ in ns]
+        self.letters_counts = letters_counts if letters_counts is not None else [0 for _ in ns]
+        self.head = head
+        self.tail = tail
+        self.length = length
+        self.suffix_array = suffix_array
+        self.sketches = sketches if sketches is not None else [None for _ in ns]
+        self.exact = exact
+
+    @classmethod
+    def from_entropy(cls, entropy, head, tail, length):
+        """
+        Returns table of counts inspected by entropy (result of Entropy.inspect_file)
+        """
+        suffix_array = next((n_gram.suffix_array for n_gram in entropy.n_grams
+                             if n_gram.suffix_array is not None), None)
+        return cls([n_gram.n for n_gram in entropy.n_grams], [n_gram.dictionary for n_gram in entropy.n_grams],
+                   [n_gram.letters_count for n_gram in entropy.n_grams], head, tail, length, suffix_array,
+                   [n_gram.sketch for n_gram in entropy.n_grams], entropy.exact)
+
+    def materialize(self):
+        """
+        Moves counts kept in suffix array to dictionaries, so they can be added to
+        """
+        if self.suffix_array is not None:
+            self.dictionaries = [dict(self.suffix_array.items(n)) if n else {} for n in self.ns]
+            self.suffix_array = None
+
+    def merge(self, other, adjacent=True):
+        """
+        Adds counts of other table to this one
+        :param other: table of text following this one
+        :param adjacent: text of other directly continues text of this table (next piece of the same file),
+        n-grams across the border are counted; False - separate text (another file of corpus)
+        """
+        self.materialize()
+        other.materialize()
+        overlap = max(self.ns) - 1
+        if adjacent:
+            joined = self.tail + other.head
+            for i, n in enumerate(self.ns):
+                if n == 0:
+                    continue
+                border = {}
+                for j in range(max(0, len(self.tail) - n + 1), min(len(self.tail), len(joined) - n + 1)):
+                    key = joined[j:j + n]
+                    border[key] = border.get(key, 0) + 1
+                    self.letters_counts[i] += 1
+                if self.exact:
+                    dictionary = self.dictionaries[i]
+                    for key, count in border.items():
+                        dictionary[key] = dictionary.get(key, 0) + count
+                if self.sketches[i] is not None:
+                    self.sketches[i].add_counts(border)
+            head = self.head + other.head if self.length < overlap else self.head
+            tail = self.tail + other.tail if other.length < overlap else other.tail
+            self.head = head[:overlap]
+            self.tail = tail[len(tail) - overlap:] if overlap < len(tail) else tail
+
+        for i, dictionary in enumerate(other.dictionaries):
+            mine = self.dictionaries[i]
+            for key, count in dictionary.items():
+                mine[key] = mine.get(key, 0) + count
+            self.letters_counts[i] += other.letters_counts[i]
+            if self.sketches[i] is None:
+                self.sketches[i] = other.sketches[i]
+            elif other.sketches[i] is not None:
+                self.sketches[i].merge(other.sketches[i])
+        self.length += other.length
+
+    def to_entropy(self, entropy):
+        """
+        Sets counts of entropy n-grams to counts of this table
+        """
+        for n_gram, dictionary, letters_count, sketch in zip(entropy.n_grams, self.dictionaries,
+                                                             self.letters_counts, self.sketches):
+            n_gram.dictionary = dictionary
+            n_gram.letters_count = letters_count
+            n_gram.different_letters_count = len(dictionary)
+            n_gram.suffix_array = None
+            n_gram.sketch = sketch
+            if self.suffix_array is not None and n_gram.n:
+                n_gram.suffix_array = self.suffix_array
+                n_gram.different_letters_count = self.suffix_array.distinct(n_gram.n)
+            n_gram.entropy = 0
+
+
 class Entropy:
-    def __init__(self, precision=3, logarithm_base=2, n_gram=0):
+    def __init__(self, precision=3, logarithm_base=2, n_gram=0, engine='dict', ngrams=None, approximate=False,
+                 check_exact=False, byte_mode=False):
+        """
+        :param approximate: count n-grams into sketches (NGramSketch) - memory does not grow with the number
+        of different n-grams, only counts of one chunk are kept exactly
+        :param check_exact: with approximate keep exact counts too, to compare estimates with them
+        :param byte_mode: inspect_file counts byte n-grams of any (binary) file, see inspect_bytes
+        """
+        if approximate and engine == 'suffix':
+            raise ValueError("suffix engine counts whole text at once, approximate counts need dict or numpy")
+        if approximate and byte_mode:
+            raise ValueError("byte n-grams are counted exactly")
         self.precision = precision
         self.logarithm_base = logarithm_base
-        self.n_grams = [NGram(1), NGram(2), NGram(3), NGram(n_gram)]
+        self.engine = engine
+        self.byte_mode = byte_mode
+        self.approximate = approximate
+        self.exact = not approximate or check_exact
+        if ngrams:
+            self.n_grams = [NGram(n) for n in ngrams]
+        else:
+            self.n_grams = [NGram(1), NGram(2), NGram(3), NGram(n_gram)]
 
     def clear(self):
         for n_gram in self.n_grams:
           n_gram.clear()
 
-    def inspect_message(self, message):
-        for n_gram in self.n_grams:
+    def inspect_message(self, message, overlap=0, n_grams=None):
+        """
+        Counts n-grams of message
+        :param message: text
+        :param overlap: number of leading characters of message already inspected as end of previous chunk,
+        n-grams lying entirely in them are not counted again
+        :param n_grams: counted NGrams (default - all)
+        """
+        if self.engine == 'numpy':
+            return self.inspect_message_numpy(message, overlap, n_grams)
+        if self.engine == 'suffix':
+            return self.inspect_message_suffix(message)
+
+        for n_gram in n_grams or self.n_grams:
             if n_gram.n == 0:
                 continue
 
-            for i in range(0, len(message) - n_gram.n + 1):
+            for i in range(max(0, overlap - n_gram.n + 1), len(message) - n_gram.n + 1):
                 n_gram.letters_count += 1
                 l = message[i:i+n_gram.n]
                 if l not in n_gram.dictionary:
@@ -92,17 +926,96 @@ class Entropy:
                     n_gram.dictionary[l] += 1
             n_gram.different_letters_count = len(n_gram.dictionary)
 
-    def get_dict_keyval(self, key, n_gram):
-        bufkey = key
-        if '\n' in key:
-            bufkey = bufkey.replace('\n', '\\n')
-        if '\t' in key:
-            bufkey = bufkey.replace('\t', '\\t')
-        if '\r' in key:
-            bufkey = bufkey.replace('\r', '\\r')
+    def inspect_message_approximate(self, message, overlap=0):
+        """
+        Counts n-grams of message like inspect_message and adds the counts to sketches of n-grams
+        Only counts of message of one n are kept in a dictionary meanwhile, they are added to the whole ones if exact
+        """
+        for n_gram in self.n_grams:
+            if n_gram.n == 0:
+                continue
+            dictionary = n_gram.dictionary
+            n_gram.dictionary = {}
+            self.inspect_message(message, overlap, [n_gram])
+            if n_gram.sketch is None:
+                n_gram.sketch = sketches.NGramSketch(n_gram.n)
+            n_gram.sketch.add_counts(n_gram.dictionary)
+            if self.exact:
+                for key, count in n_gram.dictionary.items():
+                    dictionary[key] = dictionary.get(key, 0) + count
+            n_gram.dictionary = dictionary
+            n_gram.different_letters_count = len(dictionary)
 
-        return "'" + bufkey + "'" + ": " + str(n_gram.dictionary[key]) + "(" \
-               + str(round((n_gram.dictionary[key] / n_gram.letters_count) * 100, self.precision)) + "%)"
+    def inspect_message_suffix(self, message):
+        """
+        Counts n-grams of message for all n at once with one SuffixArray - message has to be the whole text,
+        suffix array counts cannot be added to
+        """
+        if any(n_gram.letters_count or n_gram.suffix_array is not None for n_gram in self.n_grams):
+            raise ValueError("suffix engine counts whole text at once, clear() first")
+        suffix_array = SuffixArray(message, max(n_gram.n for n_gram in self.n_grams))
+        for n_gram in self.n_grams:
+            if n_gram.n == 0:
+                continue
+            n_gram.suffix_array = suffix_array
+            n_gram.letters_count = suffix_array.count(n_gram.n)
+            n_gram.different_letters_count = suffix_array.distinct(n_gram.n)
+
+    def inspect_message_numpy(self, message, overlap=0, n_grams=None):
+        """
+        Counts n-grams of message like inspect_message, vectorized: characters are mapped to indexes
+        in the alphabet of message, every n-gram is packed into one integer (rolling base arithmetic),
+        keys are counted with bincount or np.unique and only distinct keys are decoded back to strings
+        """
+        import numpy as np
+
+        if not message:
+            return
+        codes = np.frombuffer(message.encode('utf-32-le'), dtype=np.uint32)
+        # alphabet of message and index of every character in it - lookup table over code points, no sorting
+        alphabet = np.flatnonzero(np.bincount(codes))
+        table = np.zeros(int(alphabet[-1]) + 1, dtype=np.int64)
+        table[alphabet] = np.arange(len(alphabet))
+        indexes = table[codes]
+        base = len(alphabet)
+        for n_gram in n_grams or self.n_grams:
+            n = n_gram.n
+            start = max(0, overlap - n + 1)
+            count = len(message) - n + 1 - start
+            if n == 0 or count <= 0:
+                continue
+            n_gram.letters_count += count
+
+            if base ** n < 2 ** 63:
+                keys = np.zeros(count, dtype=np.int64)
+                for j in range(n):
+                    keys *= base
+                    keys += indexes[start + j:start + j + count]
+                if base ** n <= BINCOUNT_LIMIT:
+                    counts = np.bincount(keys)
+                    distinct = np.flatnonzero(counts)
+                    counts = counts[distinct]
+                else:
+                    distinct, counts = np.unique(keys, return_counts=True)
+                digits = np.empty((len(distinct), n), dtype=np.int64)
+                for j in range(n - 1, -1, -1):
+                    distinct, digits[:, j] = np.divmod(distinct, base)
+            else:
+                # packed key would overflow - unique rows of n-gram windows
+                windows = np.lib.stride_tricks.sliding_window_view(indexes[start:], n)
+                digits, counts = np.unique(windows, axis=0, return_counts=True)
+
+            text = alphabet[digits].astype(np.uint32).tobytes().decode('utf-32-le')
+            dictionary = n_gram.dictionary
+            for i, c in enumerate(counts.tolist()):
+                key = text[i * n:(i + 1) * n]
+                dictionary[key] = dictionary.get(key, 0) + c
+            n_gram.different_letters_count = len(dictionary)
+
+    def get_dict_keyval(self, key, n_gram, count=None):
+        if count is None:
+            count = n_gram.dictionary[key]
+        return format_ngram(key, count, n_gram.letters_count, self.precision)
 
     def calc_entropy(self):
         for n_gram in self.n_grams:
@@ -111,29 +1024,167 @@ class Entropy:
     def sum_entropy(self, n_gram):
         if n_gram.n == 0:
             return
-        for key in sorted(n_gram.dictionary):
-            p = n_gram.dictionary[key] / n_gram.letters_count
+        for count in n_gram.counts():
+            p = count / n_gram.letters_count
             res = math.log(1/p ** p, self.logarithm_base)
             n_gram.entropy += res
 
     def return_statistics_as_string(self):
-        statistics_string = ""
+        report = StringStats(self.precision)
+        self.write_statistics(report)
+        return report.getvalue()
+
+    def write_statistics(self, report, top=None):
+        """
+        Writes n-grams and entropy of every n to report (FileStats or a subclass) - n-grams are sorted once,
+        entropy is summed in the same pass in which they are written
+        :param report: report writer
+        :param top: write only top most frequent n-grams (heap or partition of counts, n-grams are not sorted),
+            default - all, sorted by n-gram
+        """
         for n_gram in self.n_grams:
             if n_gram.n == 0:
                 continue
-            statistics_string += "NGram n: " + str(n_gram.n) + "\n"
-            statistics_string += "Letters count: " + str(n_gram.letters_count) + "\n"
-            statistics_string += "Number of different chars: " + str(n_gram.different_letters_count) + "\n"
-            statistics_string += "<-->\n"
-            for l in sorted(n_gram.dictionary):
-                statistics_string += self.get_dict_keyval(l, n_gram) + "\n"
-            statistics_string += "<-->\n"
-            statistics_string +="Entropy of the text: " + str(n_gram.entropy) + "\n"
-            statistics_string +="Entropy normalized by length of the text: " + str(n_gram.entropy / n_gram.letters_count) + "\n"
-            statistics_string +="Entropy in %: " + str((1 - n_gram.entropy / n_gram.letters_count) * 100) + "%" + "\n"
-            statistics_string += "----------" + "\n"
-        return statistics_string
+            if self.approximate and n_gram.sketch is None:
+                n_gram.sketch = sketches.NGramSketch(n_gram.n)
+            sketch = n_gram.sketch
+            if self.exact and top is not None:
+                # entropy of all counts, in any order - only top n-grams are selected and listed
+                n_gram.entropy = 0
+                for count in n_gram.counts(ordered=False):
+                    p = count / n_gram.letters_count
+                    n_gram.entropy += math.log(1/p ** p, self.logarithm_base)
+                items = n_gram.top(top)
+            elif self.exact:
+                n_gram.entropy = 0
+                items = self._entropy_items(n_gram)
+            else:
+                # estimates - most frequent n-grams of sketch, entropy of sketch
+                n_gram.different_letters_count = sketch.distinct()
+                n_gram.entropy = sketch.entropy.estimate(self.logarithm_base)
+                items = sketch.items()
+            report.begin_ngram(n_gram)
+            if top is not None and not self.exact:
+                items = heapq.nlargest(top, items, key=lambda item: item[1])
+            for key, count in items:
+                report.write_ngram(n_gram, key, count)
+            report.end_ngram(n_gram)
+            if sketch is not None:
+                exact = (n_gram.entropy, n_gram.different_letters_count) if self.exact else (None, None)
+                report.write_estimate(n_gram, sketch.summary(self.logarithm_base, *exact))
+
+    def _entropy_items(self, n_gram):
+        """
+        Yields items of n_gram, adding entropy of every one to n_gram.entropy (the same sum as sum_entropy)
+        """
+        for key, count in n_gram.items():
+            p = count / n_gram.letters_count
+            n_gram.entropy += math.log(1/p ** p, self.logarithm_base)
+            yield key, count
 
+    def inspect_file(self, filename, case_sensitive=1, skip_whitespace=0, skip='', chunk_size=CHUNK_SIZE,
+                     start=0, end=None):
+        """
+        Counts n-grams of UTF-8 file read in chunks - last (n - 1) characters of every chunk are carried
+        to the next one, so n-grams crossing chunk boundary are counted exactly once
+        Counts are the same as of inspect_message on whole, preprocessed file content
+        Returns (head, tail, length) - first and last (max n - 1) characters and length of preprocessed text,
+        see CountTable
+        :param filename: file to be inspected
+        :param case_sensitive: 0 - lower case text before counting
+        :param skip_whitespace: 1 - remove whitespaces before counting
+        :param skip: string removed from text before counting
+        :param chunk_size: bytes read at once
+        :param start: offset of first inspected byte
+        :param end: offset after last inspected byte (default - end of file)
+        """
+        if self.byte_mode:
+            return self.inspect_bytes(filename, start, end)
+        overlap = max(n_gram.n for n_gram in self.n_grams) - 1
+        head = tail = ""
+        length = 0
+        texts = []
+        for text in self.read_chunks(filename, case_sensitive, skip_whitespace, skip, chunk_size, start, end):
+            message = tail + text
+            if self.engine == 'suffix':
+                texts.append(text)
+            elif self.approximate:
+                self.inspect_message_approximate(message, len(tail))
+            else:
+                self.inspect_message(message, len(tail))
+            tail = message[len(message) - overlap:] if overlap < len(message) else message
+            if len(head) < overlap:
+                head = (head + text)[:overlap]
+            length += len(text)
+        if self.engine == 'suffix':
+            self.inspect_message_suffix(''.join(texts))
+        return head, tail, length
+
+    def inspect_bytes(self, filename, start=0, end=None):
+        """
+        Counts byte n-grams of memory mapped file (bytes from start to end) with ByteCounts, for all n at once
+        Returns (head, tail, length) like inspect_file - head and tail are empty, byte counts are not merged
+        with counts of adjacent pieces
+        """
+        import mmap
+        import numpy as np
+
+        with open(filename, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size if end is None else min(end, size)
+            if end <= start:
+                counts = ByteCounts(np.zeros(0, dtype=np.uint8), [n_gram.n for n_gram in self.n_grams])
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    view = np.frombuffer(data, dtype=np.uint8)[start:end]
+                    counts = ByteCounts(view, [n_gram.n for n_gram in self.n_grams])
+                    del view
+        for n_gram in self.n_grams:
+            if n_gram.n == 0:
+                continue
+            n_gram.suffix_array = counts
+            n_gram.letters_count = counts.count(n_gram.n)
+            n_gram.different_letters_count = counts.distinct(n_gram.n)
+        return "", "", end - start if end > start else 0
+
+    def read_chunks(self, filename, case_sensitive=1, skip_whitespace=0, skip='', chunk_size=CHUNK_SIZE,
+                    start=0, end=None):
+        """
+        Yields preprocessed text of file (bytes from start to end) read in chunks of chunk_size bytes
+        Multibyte UTF-8 characters split between chunks are decoded incrementally, text which may still change
+        with the next chunk (end of a word for lower case, possible beginning of skipped string) is held back
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        lower_carry = ""
+        skip_carry = ""
+        with open(filename, 'rb') as f:
+            f.seek(start)
+            remaining = end - start if end is not None else None
+            while True:
+                data = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if remaining is not None:
+                    remaining -= len(data)
+                final = not data
+                text = decoder.decode(data, final)
+                if not case_sensitive:
+                    # lower case of a letter may depend on its word (final sigma), words end on a whitespace
+                    text = lower_carry + text
+                    cut = len(text) if final else max(text.rfind(c) for c in WHITESPACES) + 1
+                    if len(text) - cut > WORD_CARRY_LIMIT:
+                        cut = len(text)
+                    text, lower_carry = self.case_not_sensitive(text[:cut]), text[cut:]
+                if skip_whitespace:
+                    text = self.skip_whitespaces(text)
+                if skip != '':
+                    # text after last occurrence of skip, which can be beginning of the next one, waits for next chunk
+                    parts = (skip_carry + text).split(skip)
+                    cut = len(parts[-1]) if final else max(0, len(parts[-1]) - len(skip) + 1)
+                    text = ''.join(parts[:-1]) + parts[-1][:cut]
+                    skip_carry = parts[-1][cut:]
+                if text:
+                    yield text
+                if final:
+                    return
 
     def skip_whitespaces(self, message):
         message = ''.join(message.split(' '))
@@ -143,43 +1194,328 @@ class Entropy:
         return message
 
     def case_not_sensitive(self, message):
-        return message.lower(),
+        return message.lower()
 
     def skip_certain_chars(self, message, char):
         return ''.join(message.split(char))
 
-parser = Parser()
-parser.init_parameters()
-args = parser.parse_args()
-
-caseSensitive = args.case
-skipWhitespace = args.whitespace
-filenames = args.filenames
-logbase = args.logbase
-precision = args.precision
-skip = args.skip
-
-message = ""
-entropyHelper = Entropy(precision, logbase)
-file = FileStats(filenames, caseSensitive, skipWhitespace, logbase, precision)
-
-for filename in filenames:
-    with codecs.open(filename, 'r', 'utf-8') as f:
-        message = f.read()
-
-    file.write_line("Name of the file: " + filename)
-    if not caseSensitive:
-        message = entropyHelper.case_not_sensitive(message)
-    if skipWhitespace:
-        message = entropyHelper.skip_whitespaces(message)
-    if skip != '':
-        message = entropyHelper.skip_certain_chars(message, skip)
-
-    entropyHelper.inspect_message(message)
-    entropyHelper.calc_entropy()
-    file.write_line(entropyHelper.return_statistics_as_string())
-    file.write_break_line()
-    entropyHelper.clear()
-
-file.close()
-print("Statistics has been saved to file named " + file.filename)
\ No newline at end of file
+class SlidingEntropy:
+    """
+    Entropy of symbols (characters or bytes) of a sliding window - counts of symbols and sum of c * log(c)
+    over counts are updated by symbols entering and leaving the window, entropy is log(W) - sum / W
+    for window of W symbols, so a step costs O(number of moved symbols), not O(window)
+    """
+    def __init__(self, logarithm_base=2):
+        self.logarithm_base = logarithm_base
+        self.counts = {}
+        self.size = 0
+        self.sum = 0.0
+
+    def _update(self, symbols, sign):
+        counts = self.counts
+        for symbol, k in collections.Counter(symbols).items():
+            old = counts.get(symbol, 0)
+            new = old + sign * k
+            self.sum += (new * math.log(new) if new else 0.0) - (old * math.log(old) if old else 0.0)
+            if new:
+                counts[symbol] = new
+            else:
+                del counts[symbol]
+        self.size += sign * len(symbols)
+
+    def add(self, symbols):
+        self._update(symbols, 1)
+
+    def remove(self, symbols):
+        self._update(symbols, -1)
+
+    def entropy(self):
+        if not self.size:
+            return 0.0
+        return max(0.0, math.log(self.size) - self.sum / self.size) / math.log(self.logarithm_base)
+
+
+def entropy_profile(chunks, window, step, logarithm_base=2):
+    """
+    Yields (offset, number of symbols, entropy) of windows of window symbols starting at 0, step, 2 * step, ...
+    while the whole window is in the stream - stream shorter than window gives one window of all its symbols
+    Only the current window and the next chunk are kept in memory
+    :param chunks: iterable of str (characters are symbols) or bytes (bytes are symbols)
+    :param window: symbols of one window
+    :param step: symbols between starts of neighbouring windows
+    :param logarithm_base: logarithm base of entropy
+    """
+    sliding = SlidingEntropy(logarithm_base)
+    buffer = None
+    base = 0
+    start = None
+    for chunk in chunks:
+        buffer = chunk if buffer is None else buffer + chunk
+        if start is None:
+            if len(buffer) < window:
+                continue
+            sliding.add(buffer[:window])
+            start = 0
+            yield start, window, sliding.entropy()
+        while base + len(buffer) >= start + step + window:
+            following = start + step
+            # symbols of current window only leave, symbols of next window only enter
+            sliding.remove(buffer[start - base:min(start + window, following) - base])
+            sliding.add(buffer[max(start + window, following) - base:following + window - base])
+            start = following
+            yield start, window, sliding.entropy()
+        buffer = buffer[start - base:]
+        base = start
+    if start is None and buffer:
+        sliding.add(buffer)
+        yield 0, len(buffer), sliding.entropy()
+
+
+def read_bytes(filename, chunk_size=CHUNK_SIZE):
+    """
+    Yields content of file in chunks of chunk_size bytes
+    """
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+
+def can_split(skip_whitespace, skip):
+    """
+    Return if file can be split into pieces after whitespace bytes and every piece preprocessed separately -
+    whitespace ends a word (lower case context), skipped string must not cross it
+    """
+    return skip == '' or (not skip_whitespace and not any(c in skip for c in WHITESPACES))
+
+
+def segment_bounds(filename, segment_size=SEGMENT_SIZE, start=0):
+    """
+    Returns list of (start, end) byte ranges covering the file from start, about segment_size bytes each
+    Every range but the first starts right after a whitespace byte (never inside of UTF-8 character or a word)
+    """
+    size = os.path.getsize(filename)
+    starts = [start]
+    with open(filename, 'rb') as f:
+        for position in range(start + segment_size, size, segment_size):
+            f.seek(position)
+            block = f.read(min(segment_size, BOUNDARY_SEARCH))
+            found = [i for i in (block.find(c) for c in WHITESPACES.encode('ascii')) if i >= 0]
+            if found and position + min(found) + 1 < size:
+                starts.append(position + min(found) + 1)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _inspect_segment(filename, start, end, n_gram, options):
+    """
+    Returns CountTable of byte range of file - task of a worker process
+    """
+    entropy = Entropy(n_gram=n_gram, engine=options['engine'], ngrams=options['ngrams'],
+                      approximate=options['approximate'], check_exact=options['check_exact'],
+                      byte_mode=options['byte_mode'])
+    head, tail, length = entropy.inspect_file(filename, options['case_sensitive'], options['skip_whitespace'],
+                                              options['skip'], options['chunk_size'], start, end)
+    return CountTable.from_entropy(entropy, head, tail, length)
+
+
+def inspect_files(filenames, jobs=1, segment_size=SEGMENT_SIZE, n_gram=0, cache=None, **options):
+    """
+    Yields (filename, CountTable) for every file, in order
+    Files and pieces of large files are counted by a pool of jobs processes, a few tasks are in flight at once
+    :param filenames: files to be inspected
+    :param jobs: number of processes (1 - current process, None - number of cpus)
+    :param segment_size: bytes of one piece of a large file
+    :param n_gram: additional n-gram length, see Entropy
+    :param cache: countcache.CountCache - counts of unchanged files are read from it, of appended files
+    only the appended text is counted, new counts are stored to it
+    :param options: case_sensitive, skip_whitespace, skip, chunk_size - see Entropy.inspect_file,
+    engine, ngrams, approximate, check_exact, byte_mode - see Entropy
+    """
+    options = dict({'case_sensitive': 1, 'skip_whitespace': 0, 'skip': '', 'chunk_size': CHUNK_SIZE,
+                    'engine': 'dict', 'ngrams': None, 'approximate': False, 'check_exact': False,
+                    'byte_mode': False}, **options)
+    jobs = jobs or os.cpu_count() or 1
+    # byte counts have no head and tail of text - files are counted whole
+    splittable = not options['byte_mode'] and can_split(options['skip_whitespace'], options['skip'])
+    if cache is not None:
+        key = countcache.options_key(options['ngrams'] or [1, 2, 3, n_gram], options['case_sensitive'],
+                                     options['skip_whitespace'], options['skip'], options['byte_mode'])
+
+    def cached(filename):
+        """
+        Returns (cached table or None, offset to count the file from or None if cached table is complete)
+        """
+        if cache is None:
+            return None, 0
+        fields, start = cache.lookup(filename, key, splittable)
+        return (CountTable(**fields) if fields is not None else None), start
+
+    def counted(filename, table, counts):
+        """
+        Returns (filename, table) - cached table merged with counts of the rest of file (if any), stored to cache
+        """
+        if counts is None:
+            return filename, table
+        if table is None:
+            table = counts
+        else:
+            table.merge(counts)
+        if cache is not None:
+            table.materialize()
+            cache.store(filename, key, {"ns": table.ns, "dictionaries": table.dictionaries,
+                                        "letters_counts": table.letters_counts, "head": table.head,
+                                        "tail": table.tail, "length": table.length})
+        return filename, table
+
+    if jobs == 1:
+        for filename in filenames:
+            table, start = cached(filename)
+            counts = _inspect_segment(filename, start, None, n_gram, options) if start is not None else None
+            yield counted(filename, table, counts)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    from collections import deque
+
+    # suffix array of a file is not split - it counts whole text at once
+    split = options['engine'] != 'suffix' and splittable
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = deque()
+
+        def finished():
+            filename, table, tasks = pending.popleft()
+            counts = tasks[0].result() if tasks else None
+            for task in tasks[1:]:
+                counts.merge(task.result())
+            return counted(filename, table, counts)
+
+        for filename in filenames:
+            table, start = cached(filename)
+            if start is None:
+                bounds = []
+            else:
+                bounds = segment_bounds(filename, segment_size, start) if split else [(start, None)]
+            pending.append((filename, table, [executor.submit(_inspect_segment, filename, start, end, n_gram,
+                                                              options) for start, end in bounds]))
+            while sum(len(tasks) for _, _, tasks in pending) > 2 * jobs and len(pending) > 1:
+                yield finished()
+        while pending:
+            yield finished()
+
+
+def compare_engines(filenames, case_sensitive=1, skip_whitespace=0, skip='', chunk_size=CHUNK_SIZE, ngrams=None):
+    """
+    Counts n-grams of every file with every engine, prints MB/s and whether counts are equal to dict engine counts
+    Returns True if all counts are equal
+    """
+    equal = True
+    for filename in filenames:
+        size = os.path.getsize(filename)
+        reference = None
+        for engine in ENGINES:
+            entropy = Entropy(engine=engine, ngrams=ngrams)
+            time = timeit.timeit(lambda: entropy.inspect_file(filename, case_sensitive, skip_whitespace, skip,
+                                                              chunk_size), number=1)
+            counts = [(n_gram.n, n_gram.letters_count, dict(n_gram.items())) for n_gram in entropy.n_grams]
+            if reference is None:
+                reference = counts
+            same = counts == reference
+            equal = equal and same
+            print("%s %-6s %10.2f MB/s  counts equal: %s" % (filename, engine, size / time / 1e6, same))
+    return equal
+
+
+def main(argv=None):
+    parser = Parser()
+    parser.init_parameters()
+    args = parser.parse_args(argv)
+
+    caseSensitive = args.case
+    skipWhitespace = args.whitespace
+    filenames = args.filenames
+    logbase = args.logbase
+    precision = args.precision
+    skip = args.skip
+
+    engine = args.engine or ('suffix' if args.ngrams and not args.approximate else 'dict')
+    if args.approximate and engine == 'suffix':
+        parser.error("--approximate counts text in chunks, use dict or numpy engine")
+    if args.approximate and args.bytes:
+        parser.error("--bytes counts exactly, it cannot be used with --approximate")
+    if args.approximate and args.cache:
+        parser.error("--cache keeps exact counts, it cannot be used with --approximate")
+    chunk_size = args.chunk_size or (SKETCH_CHUNK_SIZE if args.approximate else CHUNK_SIZE)
+    step = args.step or args.window
+    if args.window is None and (args.step is not None or args.threshold is not None):
+        parser.error("--step and --threshold are options of --window")
+    if args.window is not None and (args.window < 1 or step < 1):
+        parser.error("--window and --step have to be positive")
+    if args.window is not None:
+        unused = [option for option, given in [('--jobs', args.jobs != 1), ('--cache', args.cache),
+                                               ('--top', args.top is not None), ('--aggregate', args.aggregate),
+                                               ('--approximate', args.approximate), ('--ngrams', args.ngrams),
+                                               ('--engine', args.engine)] if given]
+        if unused:
+            parser.error("--window writes entropy profile of single symbols of every file, it cannot be used with "
+                         + ", ".join(unused))
+
+    if args.compare_engines:
+        return 0 if compare_engines(filenames, caseSensitive, skipWhitespace, skip, chunk_size,
+                                    args.ngrams) else 1
+
+    entropyHelper = Entropy(precision, logbase, engine=engine, ngrams=args.ngrams, approximate=args.approximate,
+                            check_exact=args.check_exact, byte_mode=args.bytes)
+    file = REPORT_FORMATS[args.format](filenames, caseSensitive, skipWhitespace, logbase, precision)
+
+    if args.window:
+        for filename in filenames:
+            if args.bytes:
+                chunks = read_bytes(filename, chunk_size)
+            else:
+                chunks = entropyHelper.read_chunks(filename, caseSensitive, skipWhitespace, skip, chunk_size)
+            file.begin_file(filename)
+            file.begin_profile(args.window, step)
+            for offset, size, entropy in entropy_profile(chunks, args.window, step, logbase):
+                if args.threshold is None or entropy >= args.threshold:
+                    file.write_window(offset, size, entropy)
+            file.end_file()
+        file.close()
+        print("Entropy profile has been saved to file named " + file.filename)
+        return 0
+
+    corpus = None
+    cache = countcache.CountCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+
+    for filename, table in inspect_files(filenames, args.jobs, args.segment_size, cache=cache,
+                                         case_sensitive=caseSensitive, skip_whitespace=skipWhitespace,
+                                         skip=skip, chunk_size=chunk_size,
+                                         engine=engine, ngrams=args.ngrams, approximate=args.approximate,
+                                         check_exact=args.check_exact, byte_mode=args.bytes):
+        file.begin_file(filename)
+        table.to_entropy(entropyHelper)
+        entropyHelper.write_statistics(file, args.top)
+        file.end_file()
+        entropyHelper.clear()
+        if args.aggregate:
+            if corpus is None:
+                corpus = table
+            else:
+                corpus.merge(table, adjacent=False)
+
+    if corpus is not None:
+        file.begin_aggregate(len(filenames))
+        corpus.to_entropy(entropyHelper)
+        entropyHelper.write_statistics(file, args.top)
+        file.end_file()
+        entropyHelper.clear()
+
+    if cache is not None:
+        cache.save()
+    file.close()
+    print("Statistics has been saved to file named " + file.filename)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import sys
+import math
+import hashlib
+
+"""
+Bounded memory sketches of n-gram counts - Count-Min sketch (frequencies of heavy hitters), HyperLogLog
+(number of different n-grams) and stable distribution entropy sketch (Clifford, Cosma: A simple sketching
+algorithm for entropy estimation over streaming data, 2013)
+Every n-gram is hashed once with keyed blake2b, all sketches derive their randomness from that hash, so
+sketches of different files and worker processes are merged by adding (or taking maximum of) their arrays
+"""
+
+"""counters in one Count-Min row - added count is overestimated by at most e / width * total count"""
+CMS_WIDTH = 1 << 14
+
+"""Count-Min rows - the bound above holds with probability 1 - e^-depth"""
+CMS_DEPTH = 4
+
+"""HyperLogLog uses 2^precision registers, relative standard error 1.04 / sqrt(2^precision)"""
+HLL_PRECISION = 14
+
+"""registers of entropy sketch - standard error of the estimate is sqrt(3 / registers) nats"""
+ENTROPY_REGISTERS = 256
+
+"""most frequent n-gram candidates kept with their Count-Min estimates"""
+HEAVY_HITTERS = 1000
+
+"""keys hashed into entropy sketch at once - bounds the temporary (keys x registers) matrix"""
+ENTROPY_BATCH = 512
+
+"""key of blake2b - same hashes in every process"""
+HASH_KEY = b'fileStats sketch'
+
+
+def hash_keys(keys):
+    """
+    Returns numpy uint64 array of 64-bit hashes of strings
+    """
+    import numpy as np
+    return np.array([int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8, key=HASH_KEY).digest(),
+                                    'little') for key in keys], dtype=np.uint64)
+
+
+def mix(values, seed):
+    """
+    Returns splitmix64 finalizer of values + seed (numpy uint64 arrays) - independent hash for every seed
+    """
+    import numpy as np
+    z = values + np.uint64((seed * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def uniform(values):
+    """
+    Returns floats in open interval (0, 1) from 53 high bits of uint64 values
+    """
+    import numpy as np
+    return ((values >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+
+class CountMinSketch:
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        import numpy as np
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def _columns(self, hashes):
+        import numpy as np
+        return [(mix(hashes, row + 1) % np.uint64(self.width)).astype(np.intp) for row in range(self.depth)]
+
+    def add(self, hashes, counts):
+        import numpy as np
+        for row, columns in enumerate(self._columns(hashes)):
+            np.add.at(self.table[row], columns, counts)
+
+    def query(self, hashes):
+        """
+        Returns estimated counts of hashed keys - never lower than the exact ones
+        """
+        import numpy as np
+        return np.min([self.table[row][columns] for row, columns in enumerate(self._columns(hashes))], axis=0)
+
+    def merge(self, other):
+        self.table += other.table
+
+    def error(self, total):
+        """
+        Returns (bound, probability) - estimated count exceeds exact one by at most bound with the probability
+        """
+        return int(math.ceil(math.e / self.width * total)), 1 - math.exp(-self.depth)
+
+    def nbytes(self):
+        return self.table.nbytes
+
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        import numpy as np
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        import numpy as np
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        # rank - position of the lowest set bit of low 32 bits, lowest bit isolated exactly as power of two
+        low = (hashes & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        lowest = low & -low
+        rank = np.where(low == 0, 33, np.log2(np.maximum(lowest, 1)).astype(np.int64) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        import numpy as np
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        """
+        Returns estimated number of different added keys
+        """
+        import numpy as np
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # small range correction - linear counting
+            return m * math.log(m / zeros)
+        return raw
+
+    def error(self):
+        """
+        Returns relative standard error of estimate
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def nbytes(self):
+        return self.registers.nbytes
+
+
+class EntropySketch:
+    """
+    Linear sketch y_j = sum of count(key) * X(key, j) with X maximally skewed stable (alpha = 1) variables,
+    E[exp(y_j / total)] = exp(-H), so H (nats) is estimated as -log of mean of exp(y_j / total)
+    """
+    def __init__(self, registers=ENTROPY_REGISTERS):
+        import numpy as np
+        self.registers = registers
+        self.sums = np.zeros(registers, dtype=np.float64)
+        self.total = 0
+
+    def add(self, hashes, counts):
+        import numpy as np
+        seeds = np.arange(self.registers, dtype=np.uint64) * np.uint64(2)
+        counts = np.asarray(counts, dtype=np.float64)
+        for start in range(0, len(hashes), ENTROPY_BATCH):
+            batch = hashes[start:start + ENTROPY_BATCH, None]
+            w1 = math.pi * (uniform(mix(batch + seeds, 101)) - 0.5)
+            w2 = -np.log(uniform(mix(batch + seeds, 102)))
+            stable = np.tan(w1) * (math.pi / 2 - w1) + np.log(w2 * np.cos(w1) / (math.pi / 2 - w1))
+            self.sums += counts[start:start + ENTROPY_BATCH] @ stable
+        self.total += int(counts.sum())
+
+    def merge(self, other):
+        self.sums += other.sums
+        self.total += other.total
+
+    def estimate(self, logarithm_base=math.e):
+        """
+        Returns estimated entropy of added counts
+        """
+        import numpy as np
+        if not self.total:
+            return 0.0
+        scaled = self.sums / self.total
+        # log of mean of exponents, shifted by maximum - no overflow
+        top = float(scaled.max())
+        nats = -(top + math.log(float(np.mean(np.exp(scaled - top)))))
+        return max(0.0, nats) / math.log(logarithm_base)
+
+    def error(self, logarithm_base=math.e):
+        """
+        Returns standard error of estimate - exp(y_j / total) have relative standard deviation sqrt(3)
+        for every distribution
+        """
+        return math.sqrt(3 / self.registers) / math.log(logarithm_base)
+
+    def nbytes(self):
+        return self.sums.nbytes
+
+
+class NGramSketch:
+    """
+    Sketches of counts of n-grams of one length - letters count is exact, number of different n-grams,
+    entropy and counts of heavy hitters are estimated in memory independent of the number of different n-grams
+    """
+    def __init__(self, n, heavy=HEAVY_HITTERS):
+        self.n = n
+        self.heavy = heavy
+        self.count_min = CountMinSketch()
+        self.hyper_log_log = HyperLogLog()
+        self.entropy = EntropySketch()
+        self.letters_count = 0
+        # n-gram -> hash of candidates for most frequent n-grams
+        self.candidates = {}
+
+    def add_counts(self, dictionary):
+        """
+        Adds exact counts of a piece of text (dictionary n-gram -> count)
+        """
+        import numpy as np
+        if not dictionary:
+            return
+        keys = list(dictionary)
+        hashes = hash_keys(keys)
+        counts = np.array([dictionary[key] for key in keys], dtype=np.int64)
+        self.count_min.add(hashes, counts)
+        self.hyper_log_log.add(hashes)
+        self.entropy.add(hashes, counts)
+        self.letters_count += int(counts.sum())
+        self._prune(dict(zip(keys, hashes.tolist())))
+
+    def merge(self, other):
+        self.count_min.merge(other.count_min)
+        self.hyper_log_log.merge(other.hyper_log_log)
+        self.entropy.merge(other.entropy)
+        self.letters_count += other.letters_count
+        self._prune(other.candidates)
+
+    def _prune(self, new):
+        """
+        Keeps heavy candidates with the highest Count-Min estimates of candidates and new keys
+        """
+        import numpy as np
+        candidates = dict(self.candidates, **new) if self.candidates else dict(new)
+        if len(candidates) > self.heavy:
+            keys = list(candidates)
+            estimates = self.count_min.query(np.array([candidates[key] for key in keys], dtype=np.uint64))
+            keep = np.argpartition(-estimates, self.heavy)[:self.heavy]
+            candidates = {keys[i]: candidates[keys[i]] for i in keep.tolist()}
+        self.candidates = candidates
+
+    def items(self):
+        """
+        Yields (n-gram, estimated count) of heavy hitter candidates sorted by n-gram
+        """
+        import numpy as np
+        keys = sorted(self.candidates)
+        if not keys:
+            return
+        estimates = self.count_min.query(np.array([self.candidates[key] for key in keys], dtype=np.uint64))
+        for key, count in zip(keys, estimates.tolist()):
+            yield key, count
+
+    def distinct(self):
+        return int(round(self.hyper_log_log.estimate()))
+
+    def nbytes(self):
+        """
+        Returns bytes used by sketches and heavy hitter candidates
+        """
+        return (self.count_min.nbytes() + self.hyper_log_log.nbytes() + self.entropy.nbytes()
+                + sys.getsizeof(self.candidates) + sum(sys.getsizeof(key) for key in self.candidates))
+
+    def summary(self, logarithm_base=2, exact_entropy=None, exact_different=None):
+        """
+        Returns dict of estimates, their errors and memory used, with exact values if they were counted too
+        """
+        count_error, confidence = self.count_min.error(self.letters_count)
+        return {"n": self.n, "memory": self.nbytes(), "letters_count": self.letters_count,
+                "different_count": self.distinct(), "different_count_error": self.hyper_log_log.error(),
+                "entropy": self.entropy.estimate(logarithm_base), "entropy_error": self.entropy.error(logarithm_base),
+                "count_error": count_error, "count_confidence": confidence,
+                "exact_different_count": exact_different, "exact_entropy": exact_entropy}
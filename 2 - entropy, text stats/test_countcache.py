@@ -0,0 +1,156 @@
+import os
+
+import pytest
+
+import countcache
+import fileStats
+
+"""
+Cache hits (by path and by content), append-only recount, full recount of files not ending with whitespace
+and LRU eviction - counts read from cache have to be equal to counts of the whole file
+"""
+
+TEXT = "Abc ΣσςX yZ\nąĘółŻź ΑΣ €𝄞 ab\r\nAAbb aa ΣΣ 𝄞𝄞 żŻ xyzXYZ\n" * 20
+
+
+def counts(filename, cache=None, **options):
+    """
+    Returns counts of file (n, letters count, n-grams) counted with cache and the same counts without it
+    """
+    result = []
+    for cache_ in (cache, None):
+        (_, table), = fileStats.inspect_files([filename], cache=cache_, **options)
+        entropy = fileStats.Entropy(ngrams=options.get('ngrams'), byte_mode=options.get('byte_mode', False))
+        table.to_entropy(entropy)
+        result.append([(n_gram.n, n_gram.letters_count, dict(n_gram.items())) for n_gram in entropy.n_grams])
+    return result
+
+
+@pytest.fixture
+def cache_directory(tmp_path):
+    return str(tmp_path / "cache")
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    path = tmp_path / "text.txt"
+    path.write_text(TEXT, encoding='utf-8')
+    return str(path)
+
+
+def run(filename, cache_directory, max_bytes=countcache.DEFAULT_CACHE_SIZE, **options):
+    cache = countcache.CountCache(cache_directory, max_bytes)
+    cached, full = counts(filename, cache, **options)
+    cache.save()
+    assert cached == full
+    return cached
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """
+    List of files hashed by countcache.hash_file - read in full
+    """
+    files = []
+    hash_file = countcache.hash_file
+
+    def recording(filename, prefix=None):
+        files.append(os.path.abspath(filename))
+        return hash_file(filename, prefix)
+    monkeypatch.setattr(countcache, 'hash_file', recording)
+    return files
+
+
+@pytest.fixture
+def segments(monkeypatch):
+    """
+    List of (filename, start) of counted pieces of files
+    """
+    counted = []
+    inspect_segment = fileStats._inspect_segment
+
+    def recording(filename, start, end, n_gram, options):
+        counted.append((os.path.abspath(filename), start))
+        return inspect_segment(filename, start, end, n_gram, options)
+    monkeypatch.setattr(fileStats, '_inspect_segment', recording)
+    return counted
+
+
+@pytest.mark.parametrize("options", [{}, {"case_sensitive": 0, "skip": "a"}, {"ngrams": [1, 2, 3, 4, 5]},
+                                     {"byte_mode": True}])
+def test_hit(text_file, cache_directory, hashed, segments, options):
+    first = run(text_file, cache_directory, **options)
+    assert segments.count((text_file, 0)) == 2
+    second = run(text_file, cache_directory, **options)
+    assert second == first
+    # unchanged file - neither counted nor hashed
+    assert segments.count((text_file, 0)) == 3
+    assert hashed == [text_file]
+
+
+def test_hit_by_content(tmp_path, text_file, cache_directory, hashed, segments):
+    copy = str(tmp_path / "copy.txt")
+    with open(text_file, 'rb') as src, open(copy, 'wb') as dst:
+        dst.write(src.read())
+    run(text_file, cache_directory)
+    run(copy, cache_directory)
+    assert (copy, 0) in segments and segments.count((copy, 0)) == 1
+    # path of the copy is indexed - the next lookup does not hash it
+    run(copy, cache_directory)
+    assert hashed == [text_file, copy]
+    cache = countcache.CountCache(cache_directory)
+    assert sorted(entry["path"] for entry in cache.entries.values()) == sorted([text_file, copy])
+    assert len(os.listdir(cache_directory)) == 2
+
+
+@pytest.mark.parametrize("options", [{}, {"ngrams": [1, 2, 3, 4, 5, 6]}, {"skip_whitespace": 1}])
+def test_append(text_file, cache_directory, segments, options):
+    run(text_file, cache_directory, **options)
+    size = os.path.getsize(text_file)
+    with open(text_file, 'a', encoding='utf-8') as f:
+        f.write("appended ΣΣ text 𝄞\n")
+    run(text_file, cache_directory, **options)
+    # only appended text is counted
+    assert segments.count((text_file, size)) == 1
+    # older table is replaced
+    assert len(os.listdir(cache_directory)) == 2
+
+
+def test_append_after_non_whitespace(text_file, cache_directory, segments):
+    with open(text_file, 'a', encoding='utf-8') as f:
+        f.write("no newline")
+    run(text_file, cache_directory)
+    size = os.path.getsize(text_file)
+    with open(text_file, 'a', encoding='utf-8') as f:
+        f.write("s appended")
+    run(text_file, cache_directory)
+    assert (text_file, size) not in segments
+    assert segments.count((text_file, 0)) == 4
+
+
+def test_changed(text_file, cache_directory, segments):
+    run(text_file, cache_directory)
+    with open(text_file, 'w', encoding='utf-8') as f:
+        f.write(TEXT.upper())
+    run(text_file, cache_directory)
+    assert segments.count((text_file, 0)) == 4
+
+
+def test_lru_eviction(tmp_path, cache_directory):
+    files = []
+    for i in range(3):
+        path = tmp_path / ("text%d.txt" % i)
+        path.write_text(TEXT * (i + 1) + str(i) * 50 + "\n", encoding='utf-8')
+        files.append(str(path))
+    for filename in files:
+        run(filename, cache_directory)
+    cache = countcache.CountCache(cache_directory)
+    sizes = {entry["path"]: entry["bytes"] for entry in cache.entries.values()}
+    assert sorted(sizes) == sorted(files)
+
+    # first file used again - second one is the least recently used
+    run(files[0], cache_directory)
+    run(files[2], cache_directory, max_bytes=sizes[files[0]] + sizes[files[2]])
+    cache = countcache.CountCache(cache_directory)
+    assert sorted(entry["path"] for entry in cache.entries.values()) == sorted([files[0], files[2]])
+    assert len(os.listdir(cache_directory)) == 3
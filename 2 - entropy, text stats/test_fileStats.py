@@ -0,0 +1,221 @@
+import csv
+import json
+import math
+import collections
+
+import pytest
+
+import fileStats
+
+"""
+Counts of every engine have to be equal to counts of dict engine, for every chunk size
+"""
+
+"""mixed 1-4 byte UTF-8 characters, cases and whitespace - chunk boundaries split multibyte characters"""
+TEXT = "Abc ΣσςX yZ\n\tąĘółŻź ΑΣ €𝄞 ab\r\nAAbb aa ΣΣ 𝄞𝄞 żŻ xyzXYZ " * 7
+
+
+def counts(entropy):
+    return [(n_gram.n, n_gram.letters_count, dict(n_gram.items())) for n_gram in entropy.n_grams]
+
+
+def engine_counts(filename, engine, ngrams=None, chunk_size=fileStats.CHUNK_SIZE, **options):
+    entropy = fileStats.Entropy(engine=engine, ngrams=ngrams)
+    entropy.inspect_file(filename, chunk_size=chunk_size, **options)
+    return counts(entropy)
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    path = tmp_path / "text.txt"
+    path.write_bytes(TEXT.encode('utf-8'))
+    return str(path)
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"case_sensitive": 0},
+    {"skip_whitespace": 1},
+    {"skip": "ab"},
+    {"skip": "Σ𝄞"},
+    {"case_sensitive": 0, "skip_whitespace": 1, "skip": "aa"},
+])
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, fileStats.CHUNK_SIZE])
+def test_engines_equal(text_file, options, chunk_size):
+    reference = engine_counts(text_file, 'dict', **options)
+    assert reference[0][1] > 0
+    for engine in fileStats.ENGINES:
+        assert engine_counts(text_file, engine, chunk_size=chunk_size, **options) == reference, engine
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 64, fileStats.CHUNK_SIZE])
+def test_engines_equal_ngram_range(text_file, chunk_size):
+    ngrams = fileStats.parse_ngrams("1-8")
+    reference = engine_counts(text_file, 'dict', ngrams)
+    assert [n for n, _, _ in reference] == list(range(1, 9))
+    for engine in fileStats.ENGINES:
+        assert engine_counts(text_file, engine, ngrams, chunk_size, case_sensitive=0) == \
+            engine_counts(text_file, 'dict', ngrams, case_sensitive=0), engine
+        assert engine_counts(text_file, engine, ngrams, chunk_size) == reference, engine
+
+
+def report_tables(filename, report_format):
+    """
+    Returns {(file, n): table} of report - letters count, listed n-grams, normalized entropy and entropy in %
+    (None in binary report), file is '' for aggregate
+    Every table has to be complete - ended by its entropy
+    """
+    tables = {}
+    table = None
+
+    def begin(file, n, letters_count):
+        nonlocal table
+        table = tables[(file, n)] = {"letters_count": letters_count, "listed": 0, "normalized": None,
+                                     "percent": None, "complete": False}
+
+    if report_format == 'text':
+        with open(filename, encoding='utf-8') as f:
+            text = f.read()
+        assert text.endswith("\n--------------------------------------------------------\n")
+        file = n = None
+        for line in text.split("\n"):
+            if line.startswith("Name of the file: "):
+                file = line[len("Name of the file: "):]
+            elif line.startswith("Aggregate of all files"):
+                file = ""
+            elif line.startswith("NGram n: "):
+                n = int(line[len("NGram n: "):])
+            elif line.startswith("Letters count: "):
+                begin(file, n, int(line[len("Letters count: "):]))
+            elif line.startswith("'"):
+                table["listed"] += 1
+            elif line.startswith("Entropy normalized by length of the text: "):
+                table["normalized"] = line.split(": ")[1]
+            elif line.startswith("Entropy in %: "):
+                table["percent"] = line.split(": ")[1]
+                table["complete"] = True
+    elif report_format == 'jsonl':
+        with open(filename, encoding='utf-8') as f:
+            for record in map(json.loads, f):
+                if record["type"] in ("file", "aggregate"):
+                    file = record.get("name", "")
+                elif record["type"] == "table":
+                    begin(file, record["n"], record["letters_count"])
+                elif record["type"] == "ngram":
+                    table["listed"] += 1
+                elif record["type"] == "entropy":
+                    table.update(normalized=record["normalized"], percent=record["percent"], complete=True)
+    elif report_format == 'csv':
+        with open(filename, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            assert None not in row.values() and None not in row
+            key = (row["file"], int(row["n"]))
+            if row["type"] == "ngram":
+                if key not in tables:
+                    begin(*key, None)
+                tables[key]["listed"] += 1
+            elif row["type"] == "summary":
+                if key not in tables:
+                    begin(*key, None)
+                tables[key].update(letters_count=int(row["letters_count"]), normalized=row["entropy_normalized"],
+                                   percent=row["entropy_percent"], complete=True)
+    else:
+        for record in fileStats.read_binary_stats(filename):
+            if record[0] == 'F':
+                file = record[1]
+            elif record[0] == 'A':
+                file = ""
+            elif record[0] == 'T':
+                begin(file, record[1], record[2])
+            elif record[0] == 'G':
+                table["listed"] += 1
+            elif record[0] == 'E':
+                table["complete"] = True
+    assert all(table["complete"] for table in tables.values())
+    return tables
+
+
+@pytest.mark.parametrize("options, ns", [
+    ([], [1, 2, 3]),
+    (["--ngrams", "1-16"], list(range(1, 17))),
+    (["--bytes"], [1, 2, 3]),
+    (["--aggregate"], [1, 2, 3]),
+    (["--top", "2"], [1, 2, 3]),
+    (["--top", "3", "--bytes", "--ngrams", "1-4"], [1, 2, 3, 4]),
+    (["--top", "3", "--engine", "suffix"], [1, 2, 3]),
+])
+@pytest.mark.parametrize("report_format", sorted(fileStats.REPORT_FORMATS))
+def test_text_shorter_than_n(tmp_path, monkeypatch, options, ns, report_format):
+    files = {"m.txt": TEXT.encode('utf-8'), "short.txt": b"ab", "empty.txt": b""}
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+    monkeypatch.chdir(tmp_path)
+    fileStats.main(list(files) + ["--format", report_format] + options)
+    report, = tmp_path.glob("STATS_*")
+    tables = report_tables(str(report), report_format)
+
+    names = list(files) + ([""] if "--aggregate" in options else [])
+    assert sorted(tables) == sorted((name, n) for name in names for n in ns)
+    for (name, n), table in tables.items():
+        if name in files:
+            symbols = files[name] if "--bytes" in options else files[name].decode('utf-8')
+            assert table["letters_count"] == max(0, len(symbols) - n + 1)
+        if table["letters_count"] == 0:
+            assert table["listed"] == 0
+            if report_format == 'text':
+                assert (table["normalized"], table["percent"]) == ("0", "0%")
+            elif report_format == 'jsonl':
+                assert (table["normalized"], table["percent"]) == (0, 0)
+            elif report_format == 'csv':
+                assert (table["normalized"], table["percent"]) == ("", "")
+        if "--top" in options:
+            # n-grams of short.txt are all different
+            top = int(options[options.index("--top") + 1])
+            assert table["listed"] == (top if name in ("m.txt", "") else min(top, table["letters_count"]))
+
+
+def window_entropy(symbols, logarithm_base=2):
+    counts = collections.Counter(symbols)
+    return -sum(c / len(symbols) * math.log(c / len(symbols), logarithm_base) for c in counts.values())
+
+
+@pytest.mark.parametrize("window, step", [(1, 1), (7, 1), (7, 3), (7, 7), (5, 11), (64, 17), (10000, 1)])
+@pytest.mark.parametrize("chunk_size", [1, 3, 100, 100000])
+@pytest.mark.parametrize("data", [TEXT, TEXT.encode('utf-8')])
+def test_entropy_profile(window, step, chunk_size, data):
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    profile = list(fileStats.entropy_profile(chunks, window, step))
+    if len(data) < window:
+        expected = [(0, len(data))]
+    else:
+        expected = [(start, window) for start in range(0, len(data) - window + 1, step)]
+    assert [(offset, size) for offset, size, _ in profile] == expected
+    # incremental updates do not drift from entropy of every window counted again
+    for offset, size, entropy in profile:
+        assert entropy == pytest.approx(window_entropy(data[offset:offset + size]), abs=1e-9)
+
+
+def test_entropy_profile_log_base():
+    profile = list(fileStats.entropy_profile([TEXT], 50, 13, logarithm_base=10))
+    assert [entropy for _, _, entropy in profile] == \
+        pytest.approx([window_entropy(TEXT[offset:offset + 50], 10) for offset, _, _ in profile], abs=1e-9)
+
+
+@pytest.mark.parametrize("options", [
+    ["--step", "3"],
+    ["--threshold", "1.5"],
+    ["--window", "0"],
+    ["--window", "8", "--jobs", "2"],
+    ["--window", "8", "--cache", "cache"],
+    ["--window", "8", "--top", "3"],
+    ["--window", "8", "--aggregate"],
+    ["--window", "8", "--approximate"],
+    ["--window", "8", "--ngrams", "1-3"],
+])
+def test_window_options_rejected(tmp_path, monkeypatch, text_file, options):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit) as error:
+        fileStats.main([text_file] + options)
+    assert error.value.code == 2
+    assert not list(tmp_path.glob("STATS_*"))
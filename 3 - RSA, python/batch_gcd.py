@@ -0,0 +1,159 @@
+import gmpy2
+import os
+import sys
+import binascii
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Batch GCD - finds every RSA modulus sharing a prime factor with any other modulus in the set
+in quasi-linear time, instead of gcd of every pair
+Product tree of moduli, then remainder tree: z_i = P mod n_i^2, shared factor of n_i = gcd(n_i, z_i / n_i)
+https://factorable.net/weakkeys12.extended.pdf (section 3.3)
+"""
+
+"""tree levels with fewer nodes are computed in current process even if workers are given"""
+PARALLEL_LEVEL_MIN_NODES = 64
+
+
+def modulus_of(key):
+    """
+    Returns modulus of RSA key - key can be a number, public/private key tuple from rsa.RSA (n is the second item)
+    or a filename of .cert certificate generated by gen.py
+    :param key: number, tuple or filename
+    """
+    if isinstance(key, str):
+        return load_cert_modulus(key)
+    if isinstance(key, tuple):
+        return gmpy2.mpz(key[1])
+    return gmpy2.mpz(key)
+
+
+def load_cert_modulus(filename):
+    """
+    Returns modulus of the key stored in .cert file generated by gen.py (hex string of DER encoded key,
+    third line from the end - the same place check.py reads it from)
+    :param filename: certificate filename
+    """
+    from Crypto.PublicKey import RSA
+
+    with open(filename, 'r') as f:
+        lines = f.read().split('\n')
+    key = lines[len(lines) - 3].strip('\t')
+    key = key[2:len(key) - 1]
+    return gmpy2.mpz(RSA.importKey(binascii.unhexlify(key)).n)
+
+
+def _products(nodes):
+    return [nodes[i] * nodes[i + 1] if i + 1 < len(nodes) else nodes[i] for i in range(0, len(nodes), 2)]
+
+
+def _remainders(parents, nodes):
+    return [parents[i // 2] % (n * n) for i, n in enumerate(nodes)]
+
+
+def _map_level(executor, workers, function, *args):
+    """
+    Returns function(*args) for one tree level - split into chunks for process pool when level is big enough,
+    chunks have even length so children of one parent stay together
+    """
+    nodes = args[-1]
+    if executor is None or len(nodes) < PARALLEL_LEVEL_MIN_NODES:
+        return function(*args)
+    chunk = -(-len(nodes) // workers)
+    chunk += chunk % 2
+    tasks = []
+    for begin in range(0, len(nodes), chunk):
+        chunk_args = [arg[begin // 2:(begin + chunk) // 2 + 1] if arg is not nodes else arg[begin:begin + chunk]
+                      for arg in args]
+        tasks.append(executor.submit(function, *chunk_args))
+    return [result for task in tasks for result in task.result()]
+
+
+def product_tree(moduli, executor=None, workers=1):
+    """
+    Returns list of tree levels: first level - moduli, every next one - products of pairs, last one - product of all
+    :param moduli: list of numbers
+    """
+    tree = [list(moduli)]
+    while len(tree[-1]) > 1:
+        tree.append(_map_level(executor, workers, _products, tree[-1]))
+    return tree
+
+
+def remainder_tree(tree, executor=None, workers=1):
+    """
+    Returns list of P mod n_i^2 for every modulus n_i, P - product of all moduli
+    :param tree: product tree
+    """
+    remainders = tree[-1]
+    for level in reversed(tree[:-1]):
+        remainders = _map_level(executor, workers, _remainders, remainders, level)
+    return remainders
+
+
+def batch_gcd(moduli, workers=1):
+    """
+    Returns list of gcd(n_i, product of all other moduli) for every modulus n_i
+    1 - modulus shares no factor, n_i - shares both factors (or is duplicated)
+    :param moduli: list of numbers
+    :param workers: number of processes computing tree levels (None - number of cpus)
+    """
+    moduli = [gmpy2.mpz(n) for n in moduli]
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        tree = product_tree(moduli, executor, workers)
+        remainders = remainder_tree(tree, executor, workers)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return [gmpy2.gcd(n, z // n) for n, z in zip(moduli, remainders)]
+
+
+def audit(keys, workers=1):
+    """
+    Returns list of compromised keys: (index, key, modulus, shared factor)
+    Factors of moduli sharing both primes (batch gcd returns n itself) are looked up among other compromised moduli
+    :param keys: list of keys accepted by modulus_of - numbers, RSA tuples or .cert filenames
+    :param workers: number of processes (None - number of cpus)
+    """
+    keys = list(keys)
+    moduli = [modulus_of(key) for key in keys]
+    gcds = batch_gcd(moduli, workers)
+
+    compromised = [i for i, g in enumerate(gcds) if g != 1]
+    report = []
+    for i in compromised:
+        factor = gcds[i]
+        if factor == moduli[i]:
+            for j in compromised:
+                g = gmpy2.gcd(moduli[i], moduli[j])
+                if j != i and 1 < g < moduli[i]:
+                    factor = g
+                    break
+        report.append((i, keys[i], moduli[i], factor))
+    return report
+
+
+def format_report(report, total):
+    """
+    Returns audit report as text
+    :param report: result of audit
+    :param total: number of audited keys
+    """
+    lines = ["Keys audited: %d, compromised: %d" % (total, len(report))]
+    for i, key, n, factor in report:
+        label = key if isinstance(key, str) else "key #%d" % i
+        if factor == n:
+            lines.append("%s: duplicated modulus %x" % (label, n))
+        else:
+            lines.append("%s: modulus %x = %x * %x" % (label, n, factor, n // factor))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    filenames = sys.argv[1:]
+    if not filenames:
+        print("usage: batch_gcd.py FILE.cert [FILE.cert ...]")
+        sys.exit(2)
+    print(format_report(audit(filenames, workers=None), len(filenames)))
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+import platform
+import datetime
+
+"""
+Benchmark and regression suite of rsa module hot paths - every case is timed for several input sizes
+(numbers of bits, sieve limits), results are written to JSON, compare command flags cases slower than
+stored baseline
+Random inputs come from a seeded generator, so every run times the same numbers (except prime search,
+which draws from os.urandom)
+
+    python benchmark_suite.py run --output baseline.json
+    python benchmark_suite.py run --output current.json
+    python benchmark_suite.py compare baseline.json current.json
+"""
+
+"""seed of random inputs"""
+SEED = 2016
+
+"""ratio current / baseline above 1 + threshold is reported as regression"""
+DEFAULT_THRESHOLD = 0.25
+
+"""numbers checked by one call of gcd / primality cases - per call times of cheap functions are measurable"""
+BATCH = 100
+
+
+def _random_bits(rng, bits):
+    return rng.getrandbits(bits) | (1 << (bits - 1))
+
+
+def _random_prime(rng, bits):
+    import gmpy2
+    return int(gmpy2.next_prime(_random_bits(rng, bits)))
+
+
+def _rsa_keys(bits):
+    import rsa
+    keys = rsa.RSA()
+    keys.generate(bits, workers=1)
+    return keys
+
+
+def setup_gcd(function):
+    def setup(rng, bits):
+        pairs = [(_random_bits(rng, bits), _random_bits(rng, bits)) for _ in range(BATCH)]
+        return lambda: [function(a, b) for a, b in pairs]
+    return setup
+
+
+def setup_sieve(function):
+    def setup(rng, limit):
+        return lambda: list(function(limit))
+    return setup
+
+
+def setup_is_prime(function, *args, count=BATCH):
+    def setup(rng, bits):
+        numbers = [_random_prime(rng, bits) for _ in range(count)]
+        return lambda: [function(n, *args) for n in numbers]
+    return setup
+
+
+def setup_factorize_fermat(rng, bits):
+    import gmpy2
+    import rsa
+    # factors close to sqrt(n) - the case Fermat method is meant for, a few hundred iterations
+    p = _random_prime(rng, bits // 2)
+    q = int(gmpy2.next_prime(p + rng.getrandbits(bits // 4 + 6)))
+    return lambda: rsa.factorize_fermat(p * q)
+
+
+def setup_rand_n_bits_number(rng, bits):
+    import rsa
+    return lambda: [rsa.rand_n_bits_number(bits) for _ in range(BATCH)]
+
+
+def setup_generate(rng, bits):
+    import rsa
+    return lambda: rsa.RSA().generate(bits, workers=1)
+
+
+def setup_encrypt(rng, bits):
+    keys = _rsa_keys(bits)
+    text = "".join(chr(rng.randrange(32, 127)) for _ in range(256))
+    return lambda: keys.encrypt(text)
+
+
+def setup_decrypt(rng, bits):
+    keys = _rsa_keys(bits)
+    cipher = keys.encrypt("".join(chr(rng.randrange(32, 127)) for _ in range(256)))
+    return lambda: keys.decrypt(cipher)
+
+
+def setup_encrypt_bytes(rng, bits):
+    keys = _rsa_keys(bits)
+    data = bytes(rng.getrandbits(8) for _ in range(4096))
+    return lambda: keys.encrypt_bytes(data)
+
+
+def setup_decrypt_bytes(rng, bits):
+    keys = _rsa_keys(bits)
+    cipher = keys.encrypt_bytes(bytes(rng.getrandbits(8) for _ in range(4096)))
+    return lambda: keys.decrypt_bytes(cipher)
+
+
+def setup_sign(rng, bits):
+    keys = _rsa_keys(bits)
+    return lambda: keys.sign("benchmark message")
+
+
+def setup_verify_sign(rng, bits):
+    keys = _rsa_keys(bits)
+    signed = keys.sign("benchmark message")
+    return lambda: keys.verify_sign(signed, "benchmark message")
+
+
+def setup_sign_bytes(rng, bits):
+    keys = _rsa_keys(bits)
+    return lambda: keys.sign_bytes(b"benchmark message")
+
+
+def setup_verify_bytes(rng, bits):
+    keys = _rsa_keys(bits)
+    signature = keys.sign_bytes(b"benchmark message")
+    return lambda: keys.verify_bytes(signature, b"benchmark message")
+
+
+def cases(quick=False):
+    """
+    Returns list of (name, sizes, setup) - setup(rng, size) prepares inputs and returns timed function
+    :param quick: smaller sizes only, for a fast check
+    """
+    import rsa
+
+    def sizes(full, small):
+        return small if quick else full
+
+    return [
+        ("gcd", sizes([64, 512, 2048], [64, 512]), setup_gcd(rsa.gcd)),
+        ("gcd_mod", sizes([64, 512, 2048], [64, 512]), setup_gcd(rsa.gcd_mod)),
+        ("gcd_bin", sizes([64, 512, 2048], [64, 512]), setup_gcd(rsa.gcd_bin)),
+        ("sieve", sizes([10 ** 4, 10 ** 5, 10 ** 6], [10 ** 4, 10 ** 5]), setup_sieve(rsa.sieve)),
+        ("sieve_gmpy2_iter", sizes([10 ** 4, 10 ** 5, 10 ** 6], [10 ** 4, 10 ** 5]),
+         setup_sieve(rsa.sieve_gmpy2_iter)),
+        ("is_prime_naive", sizes([16, 24, 32], [16, 24]), setup_is_prime(rsa.is_prime_naive)),
+        ("is_prime_fermat", sizes([256, 512, 1024], [256]), setup_is_prime(rsa.is_prime_fermat, 20, count=10)),
+        ("is_prime_miller_rabin", sizes([256, 512, 1024], [256]),
+         setup_is_prime(rsa.is_prime_miller_rabin, 20, count=10)),
+        ("factorize_fermat", sizes([64, 128, 256], [64]), setup_factorize_fermat),
+        ("rand_n_bits_number", sizes([512, 1024, 2048], [512]), setup_rand_n_bits_number),
+        ("RSA.generate", sizes([256, 512, 1024], [256]), setup_generate),
+        ("RSA.encrypt", sizes([512, 1024], [512]), setup_encrypt),
+        ("RSA.decrypt", sizes([512, 1024], [512]), setup_decrypt),
+        ("RSA.encrypt_bytes", sizes([512, 1024], [512]), setup_encrypt_bytes),
+        ("RSA.decrypt_bytes", sizes([512, 1024], [512]), setup_decrypt_bytes),
+        ("RSA.sign", sizes([512, 1024], [512]), setup_sign),
+        ("RSA.verify_sign", sizes([512, 1024], [512]), setup_verify_sign),
+        ("RSA.sign_bytes", sizes([512, 1024], [512]), setup_sign_bytes),
+        ("RSA.verify_bytes", sizes([512, 1024], [512]), setup_verify_bytes),
+    ]
+
+
+def time_function(function, repeat, min_time):
+    """
+    Returns (number, times) - calls in one measurement and list of per call times in seconds
+    Number of calls is chosen so one measurement takes at least min_time
+    :param function: timed function
+    :param repeat: number of measurements
+    :param min_time: minimal time of one measurement in seconds
+    """
+    timer = timeit.Timer(function)
+    number, time = timer.autorange()
+    number = max(1, int(number * min_time / time)) if time < min_time else number
+    return number, [t / number for t in timer.repeat(repeat, number)]
+
+
+def environment():
+    """
+    Returns description of machine and interpreter results were measured on
+    """
+    try:
+        import gmpy2
+        gmpy2_version = gmpy2.version()
+    except ImportError:
+        gmpy2_version = None
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "system": platform.platform(), "processor": platform.processor(),
+            "cpus": os.cpu_count(), "gmpy2": gmpy2_version}
+
+
+def run(quick=False, repeat=5, min_time=0.2, selected=None, log=sys.stdout):
+    """
+    Returns results of all cases: {"environment", "date", "results": [{name, size, number, repeat, min, median}]}
+    :param quick: smaller sizes only
+    :param repeat: measurements of every case
+    :param min_time: minimal time of one measurement in seconds
+    :param selected: names of cases to run (default - all)
+    :param log: file progress is printed to (None - silent)
+    """
+    results = []
+    for name, sizes, setup in cases(quick):
+        if selected and name not in selected:
+            continue
+        for size in sizes:
+            rng = random.Random("%d %s %d" % (SEED, name, size))
+            random.seed(SEED)
+            number, times = time_function(setup(rng, size), repeat, min_time)
+            times.sort()
+            result = {"name": name, "size": size, "number": number, "repeat": repeat,
+                      "min": times[0], "median": times[len(times) // 2]}
+            results.append(result)
+            if log is not None:
+                print("%-22s %8d %14.6f ms %14.6f ms" % (name, size, result["min"] * 1000, result["median"] * 1000),
+                      file=log)
+    return {"environment": environment(), "date": datetime.datetime.now().isoformat(), "results": results}
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, key="median"):
+    """
+    Returns list of (name, size, baseline time, current time, ratio, status) for cases present in both results,
+    status is "regression", "improvement" or "ok"
+    :param baseline: result of run (stored earlier)
+    :param current: result of run
+    :param threshold: relative change reported as regression or improvement
+    :param key: compared time - "median" or "min"
+    """
+    old = {(r["name"], r["size"]): r[key] for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        if (r["name"], r["size"]) not in old:
+            continue
+        before, after = old[(r["name"], r["size"])], r[key]
+        ratio = after / before
+        status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "ok"
+        rows.append((r["name"], r["size"], before, after, ratio, status))
+    return rows
+
+
+def format_comparison(rows):
+    """
+    Returns comparison rows as text table
+    """
+    lines = ["%-22s %8s %14s %14s %8s" % ("case", "size", "baseline ms", "current ms", "ratio")]
+    for name, size, before, after, ratio, status in rows:
+        mark = "" if status == "ok" else "  " + status.upper()
+        lines.append("%-22s %8d %14.6f %14.6f %8.2f%s" % (name, size, before * 1000, after * 1000, ratio, mark))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rsa module and compare results with a baseline")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run benchmarks and write results to JSON')
+    run_parser.add_argument('--output', default='benchmark.json', help='JSON file for results')
+    run_parser.add_argument('--quick', action='store_true', help='smaller sizes only')
+    run_parser.add_argument('--repeat', type=int, default=5, help='measurements of every case')
+    run_parser.add_argument('--min-time', type=float, default=0.2, help='minimal seconds of one measurement')
+    run_parser.add_argument('--case', action='append', help='name of case to run (repeatable, default - all)')
+    run_parser.add_argument('--baseline', help='JSON file of stored results to compare with')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='relative slowdown reported as regression')
+
+    compare_parser = commands.add_parser('compare', help='compare two JSON result files')
+    compare_parser.add_argument('baseline', help='JSON file of stored results')
+    compare_parser.add_argument('current', help='JSON file of new results')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='relative slowdown reported as regression')
+    compare_parser.add_argument('--key', choices=['median', 'min'], default='median', help='compared time')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        current = run(args.quick, args.repeat, args.min_time, args.case)
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=1)
+        print("Results saved to " + args.output)
+        if args.baseline is None:
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        key = 'median'
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        key = args.key
+
+    rows = compare(baseline, current, args.threshold, key)
+    print(format_comparison(rows))
+    return 1 if any(row[5] == "regression" for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import os
+import gmpy2
+import timeit
+import primality
+
+"""
+Random candidates for prime search - bits drawn in large chunks from buffered os.urandom (CSPRNG),
+top and bottom bits forced with integer masks, optionally sieved against small primes
+Every process reads its own os.urandom stream (buffer is dropped after fork), so candidates handed out
+by parallel workers do not repeat
+"""
+
+"""bytes read from os.urandom at once"""
+RANDOM_BUFFER_SIZE = 64 * 1024
+
+
+class RandomPool:
+    """
+    Buffered os.urandom
+    """
+    def __init__(self, buffer_size=RANDOM_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.buffer = b''
+        self.position = 0
+        self.pid = os.getpid()
+
+    def read(self, n):
+        """
+        Returns n random bytes
+        """
+        if self.pid != os.getpid():
+            # forked process - do not share buffered bytes with parent
+            self.buffer, self.position, self.pid = b'', 0, os.getpid()
+        if self.position + n > len(self.buffer):
+            self.buffer = os.urandom(max(self.buffer_size, n))
+            self.position = 0
+        chunk = self.buffer[self.position:self.position + n]
+        self.position += n
+        return chunk
+
+    def getrandbits(self, n):
+        """
+        Returns random number with at most n bits
+        """
+        nbytes = (n + 7) // 8
+        return int.from_bytes(self.read(nbytes), 'big') >> (nbytes * 8 - n)
+
+
+_pool = RandomPool()
+
+
+def rand_n_bits_number(n, even=False):
+    """
+    Returning random number with exactly n bits - top bit set, bottom bit set unless even
+    :param n: number of bits to be randed
+    :param even: should generated number be even (default False) or odd (default True)
+    """
+    number = _pool.getrandbits(n) | (1 << (n - 1))
+    if not even:
+        number |= 1
+    return number
+
+
+def candidates(bits, sieved=True):
+    """
+    Yields endless stream of random odd numbers with exactly given number of bits
+    :param bits: number of bits of candidates
+    :param sieved: skip numbers divisible by primes below primality.SMALL_PRIMES_LIMIT
+    """
+    top = 1 << (bits - 1)
+    product = primality.small_primes_product()
+    while True:
+        candidate = _pool.getrandbits(bits) | top | 1
+        if sieved and gmpy2.gcd(candidate, product) != 1:
+            continue
+        yield candidate
+
+
+def benchmark(bits=(16, 512, 1024, 2048), count=2000):
+    """
+    Prints candidates/sec of bitstring.BitArray based generator (previous rsa.rand_n_bits_number),
+    rand_n_bits_number and sieved candidates stream
+    :param bits: sizes of candidates
+    :param count: number of generated candidates
+    """
+    import random
+    from bitstring import BitArray
+
+    def bitarray_rand_n_bits_number(n):
+        bit_array = BitArray(n)
+        bit_array.set(True, 0)
+        for i in range(1, n):
+            bit_array.set(random.randint(0, 1), i)
+        bit_array.set(True, n - 1)
+        return bit_array.uint
+
+    for b in bits:
+        stream = candidates(b)
+        results = [
+            ("BitArray + random.randint", timeit.timeit(lambda: bitarray_rand_n_bits_number(b), number=count // 10)
+             * 10),
+            ("rand_n_bits_number", timeit.timeit(lambda: rand_n_bits_number(b), number=count)),
+            ("candidates (sieved)", timeit.timeit(lambda: next(stream), number=count)),
+        ]
+        print("%d bits" % b)
+        for name, time in results:
+            print("\t%-28s %12.1f candidates/s" % (name, count / time))
+
+
+if __name__ == '__main__':
+    benchmark()
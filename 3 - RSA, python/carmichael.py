@@ -0,0 +1,201 @@
+import gmpy2
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import segmented_sieve
+import factorization
+
+"""
+Carmichael numbers search based on Korselt's criterion:
+n is Carmichael number if and only if n is composite, squarefree and (p - 1) | (n - 1) for every prime p | n
+https://en.wikipedia.org/wiki/Carmichael_number#Korselt's_criterion
+
+Odd numbers are processed in chunks: for every prime p up to sqrt(hi) all its multiples are ruled out
+with bytearray slices except the progression n = p mod p(p - 1) (the only multiples of p with (p - 1) | (n - 1)),
+multiples of p^2 are ruled out as not squarefree. Few remaining composites are checked with base 2 Fermat test,
+factorized (smallest prime factor table, factorization engine for bigger numbers) and verified with Korselt's criterion.
+"""
+
+"""odd numbers in one chunk"""
+CHUNK_SIZE = 2 ** 20
+
+"""numbers below this limit are factorized with smallest prime factor table"""
+SPF_TABLE_LIMIT = 2 ** 20
+
+_spf_table = None
+_worker_base_primes = None
+
+
+def smallest_prime_factor_table(limit):
+    """
+    Returns array spf, spf[m] - smallest prime factor of m for 2 <= m < limit
+    Primes are marked in descending order, so the smallest prime factor is written last
+    :param limit: size of the table
+    """
+    spf = array('I', range(limit))
+    for p in reversed(list(segmented_sieve.primes(gmpy2.isqrt(limit - 1) + 1))):
+        count = len(range(p * p, limit, p))
+        spf[p * p::p] = array('I', [p]) * count
+    return spf
+
+
+def spf_table():
+    """
+    Returns smallest prime factor table up to SPF_TABLE_LIMIT, computed once
+    """
+    global _spf_table
+    if _spf_table is None:
+        _spf_table = smallest_prime_factor_table(SPF_TABLE_LIMIT)
+    return _spf_table
+
+
+def factorize(n):
+    """
+    Returns list of prime factors of n (with repetitions) in increasing order
+    Below SPF_TABLE_LIMIT - O(log n) walk through smallest prime factor table, above it - factorization engine
+    :param n: number to be factorized
+    """
+    if n >= SPF_TABLE_LIMIT:
+        return factorization.factorize(n)
+
+    factors = []
+    spf = spf_table()
+    while n > 1:
+        factors.append(spf[n])
+        n //= spf[n]
+    return factors
+
+
+def is_korselt(n, factors):
+    """
+    Return if n with given prime factorization satisfies Korselt's criterion
+    :param n: number
+    :param factors: prime factors of n
+    """
+    if len(factors) < 2 or len(set(factors)) != len(factors):
+        return False
+    return all((n - 1) % (p - 1) == 0 for p in factors)
+
+
+def is_carmichael(n):
+    """
+    Return if n is Carmichael number
+    :param n: number to be checked
+    """
+    if n < 3 or n % 2 == 0:
+        return False
+    return is_korselt(n, factorize(n))
+
+
+def carmichael_chunk(lo, hi, base):
+    """
+    Returns list of Carmichael numbers in chunk <lo, hi), lo odd
+    :param lo: odd begin of the chunk
+    :param hi: end of the chunk (exclusive)
+    :param base: odd primes up to sqrt(hi)
+    """
+    size = (hi - lo + 1) // 2  # index i stands for lo + 2i
+    ones = memoryview(b'\x01' * size)
+    composite = bytearray(size)
+    ruled_out = bytearray(size)
+
+    for p in base:
+        if p * p >= hi:
+            break
+        # odd multiples of p from 3p, step 2p in numbers - p in indexes
+        first = max(3 * p, (lo + p - 1) // p * p)
+        if first % 2 == 0:
+            first += p
+        first = (first - lo) // 2
+        if first >= size:
+            continue
+        count = (size - 1 - first) // p + 1
+        composite[first::p] = ones[:count]
+
+        # multiples n = p mod p(p-1) survive, p(p-1) is even - step p(p-1)/2 in indexes
+        step = p * (p - 1) // 2
+        survivor = lo + (p - lo) % (p * (p - 1))
+        survivor = (survivor - lo) // 2
+        if survivor < size:
+            saved = ruled_out[survivor::step]
+            ruled_out[first::p] = ones[:count]
+            ruled_out[survivor::step] = saved
+        else:
+            ruled_out[first::p] = ones[:count]
+
+        # not squarefree
+        square = (lo + p * p - 1) // (p * p) * p * p
+        if square % 2 == 0:
+            square += p * p
+        square = (square - lo) // 2
+        if square < size:
+            ruled_out[square::p * p] = ones[:(size - 1 - square) // (p * p) + 1]
+
+    # composites not ruled out - bitwise and of both tables at once
+    candidates = (int.from_bytes(composite, 'big') & ~int.from_bytes(ruled_out, 'big')).to_bytes(size, 'big')
+    carmichael_numbers = []
+    i = candidates.find(1)
+    while i != -1:
+        n = lo + 2 * i
+        # every Carmichael number is a Fermat pseudoprime to base 2
+        if gmpy2.powmod(2, n - 1, n) == 1 and is_korselt(n, factorize(n)):
+            carmichael_numbers.append(n)
+        i = candidates.find(1, i + 1)
+    return carmichael_numbers
+
+
+def _init_worker(base):
+    global _worker_base_primes
+    _worker_base_primes = base
+
+
+def _worker_carmichael_chunk(lo, hi):
+    return carmichael_chunk(lo, hi, _worker_base_primes)
+
+
+def carmichael_numbers(hi, lo=0, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Yields Carmichael numbers from <lo, hi) in increasing order, chunks are searched in current process
+    or in a pool of processes
+    :param hi: upper border (exclusive)
+    :param lo: lower border (inclusive)
+    :param workers: number of processes (None - number of cpus)
+    :param chunk_size: odd numbers in one chunk
+    """
+    lo = max(lo, 3)
+    if lo % 2 == 0:
+        lo += 1
+    if lo >= hi:
+        return
+    base = segmented_sieve.base_primes(gmpy2.isqrt(hi - 1))
+    chunks = segmented_sieve.segment_bounds(lo, hi, chunk_size)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for begin, end in chunks:
+            for n in carmichael_chunk(begin, end, base):
+                yield n
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(base,)) as executor:
+        pending = deque()
+        for begin, end in chunks:
+            pending.append(executor.submit(_worker_carmichael_chunk, begin, end))
+            if len(pending) >= 2 * workers:
+                for n in pending.popleft().result():
+                    yield n
+        while pending:
+            for n in pending.popleft().result():
+                yield n
+
+
+if __name__ == '__main__':
+    import sys
+    import timeit
+
+    limit = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10 ** 8
+    start = timeit.default_timer()
+    for number in carmichael_numbers(limit, workers=None):
+        print(number)
+    print("%.2f s" % (timeit.default_timer() - start))
@@ -0,0 +1,301 @@
+import gmpy2
+import random
+import time
+import multiprocessing
+import primality
+import segmented_sieve
+
+"""
+Integer factorization engine: trial division, Fermat (gmpy2.isqrt_rem), Pollard p-1 and Pollard rho (Brent variant),
+run in sequence or raced in a pool of processes, bounded by time and iteration budget
+Methods raced in a pool poll a shared cancel event, so losers stop as soon as one method finds a factor
+"""
+
+"""iterations of Fermat method run before the other methods - catches factors close to sqrt(n)"""
+FERMAT_ITERATIONS = 10000
+
+"""smoothness bound of Pollard p-1 method"""
+P_MINUS_1_BOUND = 100000
+
+"""iterations of Pollard rho between budget checks (and gcd batch size)"""
+RHO_BATCH = 128
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised when factorization did not finish in given time or iteration budget
+    factors - prime factors found so far, remaining - composite cofactors not factorized
+    """
+    def __init__(self, factors, remaining):
+        super().__init__("factorization budget exceeded, remaining cofactors: %s" % remaining)
+        self.factors = factors
+        self.remaining = remaining
+
+
+"""cancel event of the race of methods, set in pool worker processes by _init_worker"""
+_cancel = None
+
+
+def _init_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def _stopped(deadline):
+    """
+    Returns if deadline passed or the race the method runs in was cancelled
+    """
+    return (deadline is not None and time.monotonic() >= deadline) or (_cancel is not None and _cancel.is_set())
+
+
+def trial_division(n):
+    """
+    Returns (factors, cofactor) - prime factors of n below primality.SMALL_PRIMES_LIMIT and what is left of n
+    :param n: number to be factorized
+    """
+    factors = []
+    if gmpy2.gcd(n, primality.small_primes_product()) == 1:
+        return factors, n
+    for p in primality.small_primes():
+        while n % p == 0:
+            factors.append(p)
+            n //= p
+        if p * p > n:
+            break
+    if 1 < n < primality.SMALL_PRIMES_LIMIT ** 2:
+        factors.append(n)
+        n = 1
+    return factors, n
+
+
+def fermat(n, max_iterations=FERMAT_ITERATIONS, deadline=None):
+    """
+    Returns factor of odd n found with Fermat method (n = a^2 - b^2), None if not found within budget
+    :param n: odd composite number
+    :param max_iterations: number of tried values of a
+    :param deadline: time.monotonic() value to stop at
+    """
+    a, remainder = gmpy2.isqrt_rem(n)
+    if remainder == 0:
+        return a
+    a += 1
+    b2 = a * a - n
+    for i in range(max_iterations):
+        b, remainder = gmpy2.isqrt_rem(b2)
+        if remainder == 0:
+            return a - b if a - b > 1 else None
+        # (a + 1)^2 - a^2 = 2a + 1
+        b2 += 2 * a + 1
+        a += 1
+        if i % 1024 == 0 and _stopped(deadline):
+            return None
+    return None
+
+
+def pollard_p_minus_1(n, bound=P_MINUS_1_BOUND, deadline=None):
+    """
+    Returns factor p of n such that p - 1 is bound-powersmooth, None if not found
+    :param n: composite number
+    :param bound: smoothness bound
+    :param deadline: time.monotonic() value to stop at
+    """
+    a = gmpy2.mpz(2)
+    for i, p in enumerate(segmented_sieve.primes(bound + 1)):
+        power = p
+        while power * p <= bound:
+            power *= p
+        a = gmpy2.powmod(a, power, n)
+        if i % 512 == 511:
+            g = gmpy2.gcd(a - 1, n)
+            if 1 < g < n:
+                return g
+            if g == n or _stopped(deadline):
+                return None
+    g = gmpy2.gcd(a - 1, n)
+    return g if 1 < g < n else None
+
+
+def pollard_rho_brent(n, max_iterations=None, deadline=None):
+    """
+    Returns factor of n found with Pollard rho method, Brent's cycle detection and batched gcd,
+    None if not found within budget
+    https://maths-people.anu.edu.au/~brent/pd/rpb051i.pdf
+    :param n: composite number
+    :param max_iterations: number of iterations of x -> x^2 + c (default - unlimited)
+    :param deadline: time.monotonic() value to stop at
+    """
+    if n % 2 == 0:
+        return 2
+    iterations = 0
+
+    def exhausted():
+        return (max_iterations is not None and iterations >= max_iterations) or _stopped(deadline)
+
+    while True:
+        y = gmpy2.mpz(random.randrange(1, n))
+        c = gmpy2.mpz(random.randrange(1, n))
+        g = q = gmpy2.mpz(1)
+        r = 1
+        x = ys = y
+        while g == 1:
+            x = y
+            # advance by r steps - as long as all the work before, so in batches with budget checks too
+            for k in range(0, r, RHO_BATCH):
+                steps = min(RHO_BATCH, r - k)
+                for _ in range(steps):
+                    y = (y * y + c) % n
+                iterations += steps
+                if exhausted():
+                    return None
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                steps = min(RHO_BATCH, r - k)
+                for _ in range(steps):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gmpy2.gcd(q, n)
+                k += steps
+                iterations += steps
+                if exhausted():
+                    return None
+            r *= 2
+        if g == n:
+            # batch overshot - repeat last batch one step at a time
+            while True:
+                ys = (ys * ys + c) % n
+                g = gmpy2.gcd(abs(x - ys), n)
+                if g > 1:
+                    break
+        if g != n:
+            return g
+
+
+def _run_method(method, n, max_iterations, deadline):
+    if method == 'fermat':
+        return fermat(n, max_iterations or FERMAT_ITERATIONS, deadline)
+    if method == 'p-1':
+        return pollard_p_minus_1(n, P_MINUS_1_BOUND, deadline)
+    random.seed()
+    return pollard_rho_brent(n, max_iterations, deadline)
+
+
+METHODS = ['fermat', 'p-1', 'rho']
+
+
+def method_pool():
+    """
+    Returns (pool, cancel) - pool of processes to race methods in (one per method) and its cancel event
+    """
+    cancel = multiprocessing.Event()
+    return multiprocessing.Pool(len(METHODS), _init_worker, (cancel,)), cancel
+
+
+def find_factor(n, deadline=None, max_iterations=None, pool=None, cancel=None):
+    """
+    Returns nontrivial factor of odd composite n, None if budget is exceeded
+    Methods run in sequence (Fermat, p-1, rho) or raced in pool of processes, first found factor wins
+    Losers of the race are cancelled and waited for, so the pool is idle when the function returns
+    :param n: odd composite number, not a perfect power
+    :param deadline: time.monotonic() value to stop at
+    :param max_iterations: iteration budget of Fermat and rho methods
+    :param pool: multiprocessing.Pool to race methods in, see method_pool
+    :param cancel: cancel event of the pool workers (required with pool), see method_pool
+    """
+    if pool is None:
+        for method in METHODS:
+            factor = _run_method(method, n, max_iterations, deadline)
+            if factor is not None:
+                return factor
+        return None
+
+    results = [pool.apply_async(_run_method, (method, n, max_iterations, deadline)) for method in METHODS]
+    factor = None
+    while results and factor is None:
+        for result in results:
+            if result.ready():
+                results.remove(result)
+                factor = result.get()
+                break
+        else:
+            time.sleep(0.001)
+    if results:
+        cancel.set()
+        for result in results:
+            result.wait()
+        cancel.clear()
+    return factor
+
+
+def perfect_power(n):
+    """
+    Returns (root, k) with root ** k == n for the greatest such k, (n, 1) if n is not a perfect power
+    """
+    for k in range(n.bit_length(), 1, -1):
+        root, exact = gmpy2.iroot(n, k)
+        if exact:
+            return root, k
+    return n, 1
+
+
+def factorize(n, time_budget=None, max_iterations=None, parallel=False):
+    """
+    Returns list of prime factors of n (with repetitions) in increasing order
+    Raises BudgetExceeded with partial result if time or iteration budget is exceeded,
+    ValueError if n is not a positive integer (1 has no prime factors)
+    :param n: number to be factorized
+    :param time_budget: seconds for the whole factorization (default - unlimited)
+    :param max_iterations: iteration budget of every Fermat and rho call (default - unlimited rho)
+    :param parallel: race methods in a pool of processes (one per method)
+    """
+    if n < 1:
+        raise ValueError("only positive integers can be factorized: %d" % n)
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    factors, n = trial_division(gmpy2.mpz(n))
+    remaining = [n] if n > 1 else []
+    pool, cancel = method_pool() if parallel and remaining else (None, None)
+    try:
+        while remaining:
+            m = remaining.pop()
+            if primality.is_prime(m):
+                factors.append(m)
+                continue
+            root, k = perfect_power(m)
+            if k > 1:
+                remaining.extend([root] * k)
+                continue
+            factor = find_factor(m, deadline, max_iterations, pool, cancel)
+            if factor is None:
+                raise BudgetExceeded(sorted(int(f) for f in factors), [int(r) for r in remaining + [m]])
+            remaining.extend([factor, m // factor])
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return sorted(int(f) for f in factors)
+
+
+def benchmark(bits=(40, 60, 80, 90, 100), time_budget=30):
+    """
+    Prints time of factorizing semiprimes p*q of increasing size with every method separately
+    and with factorize
+    :param bits: sizes of semiprimes in bits
+    :param time_budget: seconds for one factorization
+    """
+    for b in bits:
+        p = gmpy2.next_prime(random.getrandbits(b // 2) | (1 << (b // 2 - 1)))
+        q = gmpy2.next_prime(random.getrandbits(b - b // 2) | (1 << (b - b // 2 - 1)))
+        n = p * q
+        print("%d bits: %d" % (b, n))
+        for name, function in [("fermat", lambda: fermat(n)), ("p-1", lambda: pollard_p_minus_1(n)),
+                               ("rho", lambda: pollard_rho_brent(n, deadline=time.monotonic() + time_budget)),
+                               ("factorize", lambda: factorize(n, time_budget))]:
+            start = time.monotonic()
+            try:
+                result = function()
+            except BudgetExceeded:
+                result = None
+            print("\t%-10s %-40s %.4f s" % (name, result, time.monotonic() - start))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,182 @@
+import os
+import struct
+import timeit
+from Crypto.Cipher import AES
+
+"""
+Hybrid file encryption - RSA (rsa.RSA.encrypt_bytes) wraps random AES-256 session key, payload streams through
+AES-GCM in fixed-size chunks, so memory stays constant and files of any size are encrypted at disk speed
+
+File layout:
+    header: MAGIC | version (1 byte) | chunk size (4 bytes) | nonce prefix (8 bytes) | wrapped key length (2 bytes)
+            | wrapped key
+    chunks: ciphertext length with last chunk flag in the top bit (4 bytes) | ciphertext | GCM tag (16 bytes)
+Chunk nonce is nonce prefix | chunk number (4 bytes), associated data is header | chunk number | last chunk flag,
+so chunks cannot be reordered, dropped or cut off at the end
+"""
+
+MAGIC = b'RSAH'
+VERSION = 1
+
+"""plaintext bytes in one chunk"""
+CHUNK_SIZE = 1024 * 1024
+
+"""largest chunk size - bounds the buffer allocated from an unauthenticated header, below LAST_CHUNK_FLAG"""
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+SESSION_KEY_SIZE = 32
+NONCE_PREFIX_SIZE = 8
+TAG_SIZE = 16
+LAST_CHUNK_FLAG = 0x80000000
+
+_HEADER = struct.Struct('>4sBI8sH')
+_CHUNK_LENGTH = struct.Struct('>I')
+_CHUNK_INFO = struct.Struct('>I?')
+
+
+def _chunk_cipher(key, nonce_prefix, header, number, last):
+    cipher = AES.new(key, AES.MODE_GCM, nonce=nonce_prefix + struct.pack('>I', number), mac_len=TAG_SIZE)
+    cipher.update(header + _CHUNK_INFO.pack(number, last))
+    return cipher
+
+
+def _read_full(src, buffer):
+    """
+    Returns number of bytes read into buffer - reads until buffer is full or end of file
+    """
+    view = memoryview(buffer)
+    total = 0
+    while total < len(buffer):
+        read = src.readinto(view[total:])
+        if not read:
+            break
+        total += read
+    return total
+
+
+def encrypt_stream(rsa, src, dst, chunk_size=CHUNK_SIZE):
+    """
+    Encrypts binary file object src into dst with rsa public key and AES-GCM
+    :param rsa: rsa.RSA with public key
+    :param src: readable binary file object
+    :param dst: writable binary file object
+    :param chunk_size: plaintext bytes in one chunk, at most MAX_CHUNK_SIZE
+    """
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError("chunk size must be between 1 and %d" % MAX_CHUNK_SIZE)
+    key = os.urandom(SESSION_KEY_SIZE)
+    nonce_prefix = os.urandom(NONCE_PREFIX_SIZE)
+    wrapped_key = rsa.encrypt_bytes(key)
+    header = _HEADER.pack(MAGIC, VERSION, chunk_size, nonce_prefix, len(wrapped_key)) + wrapped_key
+    dst.write(header)
+
+    # two buffers - the next chunk is read ahead to know which chunk is the last one
+    current, following = bytearray(chunk_size), bytearray(chunk_size)
+    length = _read_full(src, current)
+    number = 0
+    while True:
+        next_length = _read_full(src, following) if length == chunk_size else 0
+        last = next_length == 0
+        cipher = _chunk_cipher(key, nonce_prefix, header, number, last)
+        ciphertext, tag = cipher.encrypt_and_digest(memoryview(current)[:length])
+        dst.write(_CHUNK_LENGTH.pack(length | (LAST_CHUNK_FLAG if last else 0)))
+        dst.write(ciphertext)
+        dst.write(tag)
+        if last:
+            return
+        current, following, length = following, current, next_length
+        number += 1
+
+
+def decrypt_stream(rsa, src, dst):
+    """
+    Decrypts binary file object src produced by encrypt_stream into dst
+    Raises ValueError if file is damaged, truncated or was encrypted for another key
+    :param rsa: rsa.RSA with private key
+    :param src: readable binary file object
+    :param dst: writable binary file object
+    """
+    fixed = src.read(_HEADER.size)
+    if len(fixed) != _HEADER.size:
+        raise ValueError("not a hybrid encrypted file")
+    magic, version, chunk_size, nonce_prefix, wrapped_length = _HEADER.unpack(fixed)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a hybrid encrypted file")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError("invalid chunk size")
+    wrapped_key = src.read(wrapped_length)
+    header = fixed + wrapped_key
+    key = rsa.decrypt_bytes(wrapped_key)
+    if len(key) != SESSION_KEY_SIZE:
+        raise ValueError("invalid session key")
+
+    buffer = bytearray(chunk_size + TAG_SIZE)
+    number = 0
+    while True:
+        prefix = src.read(_CHUNK_LENGTH.size)
+        if len(prefix) != _CHUNK_LENGTH.size:
+            raise ValueError("file is truncated")
+        length = _CHUNK_LENGTH.unpack(prefix)[0]
+        last = bool(length & LAST_CHUNK_FLAG)
+        length &= ~LAST_CHUNK_FLAG
+        if length > chunk_size:
+            raise ValueError("invalid chunk length")
+        view = memoryview(buffer)[:length + TAG_SIZE]
+        if _read_full(src, view) != len(view):
+            raise ValueError("file is truncated")
+
+        cipher = _chunk_cipher(key, nonce_prefix, header, number, last)
+        dst.write(cipher.decrypt_and_verify(view[:length], view[length:]))
+        if last:
+            if src.read(1):
+                raise ValueError("data after last chunk")
+            return
+        number += 1
+
+
+def encrypt_file(rsa, src_path, dst_path, chunk_size=CHUNK_SIZE):
+    """
+    Encrypts file src_path into dst_path, see encrypt_stream
+    """
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        encrypt_stream(rsa, src, dst, chunk_size)
+
+
+def decrypt_file(rsa, src_path, dst_path):
+    """
+    Decrypts file src_path into dst_path, see decrypt_stream
+    """
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        decrypt_stream(rsa, src, dst)
+
+
+def benchmark(size=256 * 1024 * 1024, bits=1024):
+    """
+    Prints MB/s of encrypt_file and decrypt_file for a temporary file of given size
+    :param size: file size in bytes
+    :param bits: bits parameter of RSA.generate
+    """
+    import tempfile
+    import filecmp
+    import rsa as rsa_module
+
+    rsa = rsa_module.RSA()
+    rsa.generate(bits)
+    directory = tempfile.mkdtemp()
+    plain, encrypted, decrypted = (os.path.join(directory, name) for name in ("plain", "encrypted", "decrypted"))
+    with open(plain, 'wb') as f:
+        for _ in range(0, size, CHUNK_SIZE):
+            f.write(os.urandom(CHUNK_SIZE))
+
+    for name, function in [("encrypt_file", lambda: encrypt_file(rsa, plain, encrypted)),
+                           ("decrypt_file", lambda: decrypt_file(rsa, encrypted, decrypted))]:
+        time = timeit.timeit(function, number=1)
+        print("%-12s %8.1f MB/s" % (name, os.path.getsize(plain) / time / 1e6))
+    assert filecmp.cmp(plain, decrypted, shallow=False)
+    for path in (plain, encrypted, decrypted):
+        os.remove(path)
+    os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,166 @@
+import random
+import timeit
+
+"""
+Modular arithmetic toolkit - iterative Euclidean and binary gcd, extended gcd, modular inverse,
+batch inversion (Montgomery's trick) and Chinese remainder theorem combination
+All functions are iterative, so big inputs do not hit recursion limit
+"""
+
+
+def gcd(a, b):
+    """
+    Returns greatest common divisor - iterative Euclidean algorithm (remainders, not subtraction)
+    :param a: first number
+    :param b: second number
+    """
+    a, b = abs(a), abs(b)
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def binary_gcd(u, v):
+    """
+    Returns greatest common divisor - iterative binary gcd (Stein's algorithm), only shifts and subtractions
+    https://en.wikipedia.org/wiki/Binary_GCD_algorithm
+    :param u: first number
+    :param v: second number
+    """
+    u, v = abs(u), abs(v)
+    if u == 0:
+        return v
+    if v == 0:
+        return u
+    # common factors of 2
+    shift = ((u | v) & -(u | v)).bit_length() - 1
+    u >>= (u & -u).bit_length() - 1
+    while v:
+        v >>= (v & -v).bit_length() - 1
+        if u > v:
+            u, v = v, u
+        v -= u
+    return u << shift
+
+
+def extended_gcd(a, b):
+    """
+    Returns (g, x, y) such that a * x + b * y == g == gcd(a, b) - iterative extended Euclidean algorithm
+    :param a: first number
+    :param b: second number
+    """
+    x0, x1, y0, y1 = 1, 0, 0, 1
+    while b:
+        q, r = divmod(a, b)
+        a, b = b, r
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    if a < 0:
+        return -a, -x0, -y0
+    return a, x0, y0
+
+
+def inverse(a, m):
+    """
+    Returns x such that a * x == 1 (mod m), raises ValueError if a is not invertible
+    :param a: number to invert
+    :param m: modulus
+    """
+    g, x, _ = extended_gcd(a % m, m)
+    if g != 1:
+        raise ValueError("%d is not invertible modulo %d" % (a, m))
+    return x % m
+
+
+def batch_inverse(values, m):
+    """
+    Returns list of inverses of all values modulo m - Montgomery's trick:
+    one modular inversion and 3(n - 1) multiplications instead of n inversions
+    Raises ValueError if any value is not invertible
+    :param values: list of numbers to invert
+    :param m: modulus
+    """
+    import gmpy2
+
+    values = list(values)
+    if not values:
+        return []
+    m = gmpy2.mpz(m)
+    # prefix[i] = values[0] * ... * values[i]
+    prefix = [gmpy2.mpz(values[0]) % m]
+    for value in values[1:]:
+        prefix.append(prefix[-1] * value % m)
+
+    if gmpy2.gcd(prefix[-1], m) != 1:
+        raise ValueError("product of values is not invertible modulo %d" % m)
+    inv = gmpy2.invert(prefix[-1], m)
+
+    inverses = [0] * len(values)
+    for i in range(len(values) - 1, 0, -1):
+        inverses[i] = inv * prefix[i - 1] % m
+        inv = inv * values[i] % m
+    inverses[0] = inv
+    return inverses
+
+
+def garner(a_p, a_q, p, q, q_inv):
+    """
+    Returns x (0 <= x < p * q) such that x == a_p (mod p) and x == a_q (mod q) - Garner's formula
+    with precomputed q^-1 mod p, as used in RSA private key operations
+    :param a_p: residue modulo p
+    :param a_q: residue modulo q
+    :param p: first modulus
+    :param q: second modulus, coprime to p
+    :param q_inv: q^-1 mod p
+    """
+    return a_q + (q_inv * (a_p - a_q) % p) * q
+
+
+def crt_pair(a1, m1, a2, m2):
+    """
+    Returns (x, m1 * m2) - solution of x == a1 (mod m1), x == a2 (mod m2) for coprime m1, m2
+    """
+    return garner(a1, a2, m1, m2, inverse(m2, m1)) % (m1 * m2), m1 * m2
+
+
+def crt(residues, moduli):
+    """
+    Returns (x, M) - solution of x == residues[i] (mod moduli[i]) for pairwise coprime moduli, M - their product
+    :param residues: list of residues
+    :param moduli: list of pairwise coprime moduli
+    """
+    x, m = 0, 1
+    for a, n in zip(residues, moduli):
+        x, m = crt_pair(x, m, a, n) if m != 1 else (a % n, n)
+    return x, m
+
+
+def benchmark(bits=(64, 1024, 4096), count=1000):
+    """
+    Prints time of gcd, binary_gcd, extended_gcd, inverse and batch_inverse compared with gmpy2
+    :param bits: sizes of numbers
+    :param count: number of operations
+    """
+    import gmpy2
+
+    for b in bits:
+        pairs = [(random.getrandbits(b), random.getrandbits(b) | 1) for _ in range(count)]
+        m = gmpy2.next_prime(random.getrandbits(b))
+        values = [random.randrange(1, m) for _ in range(count)]
+        results = [
+            ("gcd", lambda: [gcd(a, c) for a, c in pairs]),
+            ("binary_gcd", lambda: [binary_gcd(a, c) for a, c in pairs]),
+            ("gmpy2.gcd", lambda: [gmpy2.gcd(a, c) for a, c in pairs]),
+            ("extended_gcd", lambda: [extended_gcd(a, c) for a, c in pairs]),
+            ("gmpy2.gcdext", lambda: [gmpy2.gcdext(a, c) for a, c in pairs]),
+            ("inverse", lambda: [inverse(v, m) for v in values]),
+            ("gmpy2.invert", lambda: [gmpy2.invert(v, m) for v in values]),
+            ("batch_inverse", lambda: batch_inverse(values, m)),
+        ]
+        print("%d bits, %d operations" % (b, count))
+        for name, function in results:
+            print("\t%-14s %.4f s" % (name, timeit.timeit(function, number=1)))
+
+
+if __name__ == '__main__':
+    benchmark()
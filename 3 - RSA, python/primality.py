@@ -0,0 +1,261 @@
+import gmpy2
+import math
+import random
+import os
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+import segmented_sieve
+
+"""
+Primality engine:
+Miller-Rabin with incremental squaring, deterministic witnesses for n < 2^64,
+number of random rounds derived from requested error bound, optional Baillie-PSW test,
+batch checking of many numbers sharing one small primes prefilter
+"""
+
+"""numbers are trial-divided by all primes below this limit"""
+SMALL_PRIMES_LIMIT = 2000
+
+"""default error bound - probability of composite number passing the test is at most 2 ** -DEFAULT_ERROR_BITS"""
+DEFAULT_ERROR_BITS = 128
+
+"""
+(upper border, witnesses) - Miller-Rabin with given witnesses is deterministic for every n below the border
+https://en.wikipedia.org/wiki/Miller%E2%80%93Rabin_primality_test#Testing_against_small_sets_of_bases
+"""
+DETERMINISTIC_WITNESSES = [
+    (2047, [2]),
+    (1373653, [2, 3]),
+    (25326001, [2, 3, 5]),
+    (3215031751, [2, 3, 5, 7]),
+    (2152302898747, [2, 3, 5, 7, 11]),
+    (3474749660383, [2, 3, 5, 7, 11, 13]),
+    (341550071728321, [2, 3, 5, 7, 11, 13, 17]),
+    (3825123056546413051, [2, 3, 5, 7, 11, 13, 17, 19, 23]),
+    (2 ** 64, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37]),
+]
+
+_small_primes = None
+_small_primes_product = None
+
+
+def small_primes():
+    """
+    Returns list of primes below SMALL_PRIMES_LIMIT, computed once
+    """
+    global _small_primes, _small_primes_product
+    if _small_primes is None:
+        primes = list(segmented_sieve.primes(SMALL_PRIMES_LIMIT))
+        _small_primes = primes
+        _small_primes_product = gmpy2.mpz(math.prod(primes))
+    return _small_primes
+
+
+def small_primes_product():
+    """
+    Returns product of all primes below SMALL_PRIMES_LIMIT
+    """
+    small_primes()
+    return _small_primes_product
+
+
+def trial_division(n):
+    """
+    Returns False if n is divisible by one of small primes (and is not one of them),
+    True if n is prime for sure (below SMALL_PRIMES_LIMIT ** 2), None if undecided
+    :param n: number greater than 1
+    """
+    if n < SMALL_PRIMES_LIMIT:
+        return n in small_primes()
+    if gmpy2.gcd(n, small_primes_product()) != 1:
+        return False
+    if n < SMALL_PRIMES_LIMIT * SMALL_PRIMES_LIMIT:
+        return True
+    return None
+
+
+def decompose(n):
+    """
+    Returns (s, d) such that n - 1 == 2 ** s * d, d odd
+    :param n: odd number
+    """
+    d = n - 1
+    s = gmpy2.bit_scan1(d)
+    return s, d >> s
+
+
+def is_strong_probable_prime(n, a, s, d):
+    """
+    Return if n is strong probable prime to base a - single Miller-Rabin round,
+    a ** (2 ** i * d) computed by squaring previous value instead of from scratch
+    :param n: odd number to be checked
+    :param a: base (witness)
+    :param s: exponent of 2 in n - 1
+    :param d: odd part of n - 1
+    """
+    x = gmpy2.powmod(a, d, n)
+    if x == 1 or x == n - 1:
+        return True
+    for _ in range(s - 1):
+        x = gmpy2.powmod(x, 2, n)
+        if x == n - 1:
+            return True
+        if x == 1:
+            return False
+    return False
+
+
+def deterministic_witnesses(n):
+    """
+    Returns list of witnesses making Miller-Rabin deterministic for n, None for n >= 2^64
+    :param n: number to be checked
+    """
+    for border, witnesses in DETERMINISTIC_WITNESSES:
+        if n < border:
+            return witnesses
+    return None
+
+
+def rounds_for_error(error_bits):
+    """
+    Returns number of random Miller-Rabin rounds needed for error probability at most 2 ** -error_bits,
+    every round lets composite number pass with probability at most 1/4
+    :param error_bits: requested error bound exponent
+    """
+    return max(1, (error_bits + 1) // 2)
+
+
+def miller_rabin(n, error_bits=DEFAULT_ERROR_BITS, rounds=None):
+    """
+    Return if odd number n > 2 is probably prime - Miller-Rabin primality test
+    Deterministic for n < 2^64, random witnesses otherwise
+    :param n: odd number to be checked for primality
+    :param error_bits: error bound exponent for random witnesses
+    :param rounds: number of random witnesses, overrides error_bits
+    """
+    s, d = decompose(n)
+    witnesses = deterministic_witnesses(n)
+    if witnesses is None:
+        if rounds is None:
+            rounds = rounds_for_error(error_bits)
+        witnesses = (random.randrange(2, n - 1) for _ in range(rounds))
+    for a in witnesses:
+        if a % n == 0:
+            continue
+        if not is_strong_probable_prime(n, a, s, d):
+            return False
+    return True
+
+
+def baillie_psw(n):
+    """
+    Return if odd number n is probably prime - Baillie-PSW test (strong base 2 + strong Lucas test),
+    no composite number passing it is known
+    :param n: odd number to be checked for primality
+    """
+    return gmpy2.is_strong_bpsw_prp(n)
+
+
+def is_prime(n, error_bits=DEFAULT_ERROR_BITS, bpsw=False, rounds=None):
+    """
+    Return if number is prime (probably, for n >= 2^64)
+    Trial division by small primes, then Miller-Rabin or Baillie-PSW
+    :param n: number to be checked for primality
+    :param error_bits: error bound exponent for Miller-Rabin
+    :param bpsw: use Baillie-PSW instead of random Miller-Rabin rounds for n >= 2^64
+    :param rounds: number of random Miller-Rabin rounds, overrides error_bits
+    """
+    if n < 2:
+        return False
+    result = trial_division(n)
+    if result is not None:
+        return result
+    return probable_prime_test(n, error_bits, bpsw, rounds)
+
+
+def probable_prime_test(n, error_bits=DEFAULT_ERROR_BITS, bpsw=False, rounds=None):
+    """
+    Return if number which passed trial division is probably prime - Miller-Rabin or Baillie-PSW
+    :param n: odd number to be checked for primality
+    :param error_bits: error bound exponent for Miller-Rabin
+    :param bpsw: use Baillie-PSW instead of random Miller-Rabin rounds for n >= 2^64
+    :param rounds: number of random Miller-Rabin rounds, overrides error_bits
+    """
+    if bpsw and n >= 2 ** 64:
+        return baillie_psw(n)
+    return miller_rabin(n, error_bits, rounds)
+
+
+def _probable_prime_chunk(numbers, error_bits, bpsw):
+    """
+    Returns list of results of probable_prime_test for numbers - task of a worker process
+    """
+    return [probable_prime_test(n, error_bits, bpsw) for n in numbers]
+
+
+def is_prime_many(numbers, error_bits=DEFAULT_ERROR_BITS, bpsw=False, workers=1, chunksize=256):
+    """
+    Returns list of is_prime results for every number, in the same order
+    Numbers are prefiltered together against small primes, survivors are checked in current process
+    or in a pool of processes
+    :param numbers: iterable of numbers to be checked
+    :param error_bits: error bound exponent for Miller-Rabin
+    :param bpsw: use Baillie-PSW for n >= 2^64
+    :param workers: number of processes (default 1 - current process, None - number of cpus)
+    :param chunksize: numbers in one task of a worker process
+    """
+    numbers = list(numbers)
+    results = [None] * len(numbers)
+    undecided = []
+    for i, n in enumerate(numbers):
+        results[i] = False if n < 2 else trial_division(n)
+        if results[i] is None:
+            undecided.append(i)
+
+    survivors = [numbers[i] for i in undecided]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        checked = _probable_prime_chunk(survivors, error_bits, bpsw)
+    else:
+        chunks = [survivors[j:j + chunksize] for j in range(0, len(survivors), chunksize)]
+        with ProcessPoolExecutor(workers, initializer=random.seed) as executor:
+            tasks = [executor.submit(_probable_prime_chunk, chunk, error_bits, bpsw) for chunk in chunks]
+            checked = [result for task in tasks for result in task.result()]
+    for i, result in zip(undecided, checked):
+        results[i] = result
+    return results
+
+
+def benchmark(bits=(32, 64, 512, 1024), count=200):
+    """
+    Prints time of checking count random odd numbers of given sizes with is_prime,
+    is_prime_many and functions from rsa module
+    :param bits: sizes of numbers in bits
+    :param count: number of checked numbers of every size
+    """
+    import rsa
+
+    for b in bits:
+        numbers = [random.getrandbits(b) | (1 << (b - 1)) | 1 for _ in range(count)]
+        numbers.append(gmpy2.next_prime(numbers[0]))
+        candidates = [
+            ("is_prime", lambda n: is_prime(n)),
+            ("is_prime bpsw", lambda n: is_prime(n, bpsw=True)),
+            ("rsa.is_prime_miller_rabin k=64", lambda n: rsa.is_prime_miller_rabin(n, 64)),
+            ("rsa.is_prime_fermat k=64", lambda n: rsa.is_prime_fermat(n, 64)),
+        ]
+        if b <= 32:
+            candidates.append(("rsa.is_prime_naive", rsa.is_prime_naive))
+
+        print("%d bits, %d numbers" % (b, len(numbers)))
+        for name, function in candidates:
+            time = timeit.timeit(lambda: [function(n) for n in numbers], number=1)
+            print("\t%-32s %.4f s" % (name, time))
+        time = timeit.timeit(lambda: is_prime_many(numbers), number=1)
+        print("\t%-32s %.4f s" % ("is_prime_many", time))
+        time = timeit.timeit(lambda: is_prime_many(numbers, workers=None), number=1)
+        print("\t%-32s %.4f s" % ("is_prime_many (process pool)", time))
+
+
+if __name__ == '__main__':
+    benchmark()
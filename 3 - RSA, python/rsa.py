@@ -1,10 +1,10 @@
-import gmpy2
-from Crypto.Util.number import long_to_bytes, bytes_to_long
 import random
 import math
 import timeit
-from bitstring import BitArray
 import hashlib
+import os
+import numbertheory
+from collections import deque
 
 """
 Other stuff (https://en.wikipedia.org/wiki/Euclidean_algorithm):
@@ -16,42 +16,35 @@ Chinese remainder theorem, Stern-Brocot tree, Continued fractions
 """numbers satisfying the equation: (a ** (n-1)) mod n == 1"""
 CARMICHAEL_NUMBERS = [561, 41041, 825265, 321197185, 5394826801, 232250619601, 9746347772161]
 
+"""PKCS#1 v1.5 block overhead in bytes: 0x00 0x02, at least 8 bytes of random padding, 0x00"""
+PKCS1_PADDING_OVERHEAD = 11
+
+"""number of candidates checked by one prime search task in a process pool"""
+PRIME_SEARCH_BATCH = 64
+
+"""DER encoded DigestInfo header of SHA-512 digest (https://tools.ietf.org/html/rfc8017#section-9.2)"""
+SHA512_DIGEST_INFO = bytes.fromhex('3051300d060960864801650304020305000440')
+
+"""signatures checked by one verify_many task in a process pool"""
+VERIFY_BATCH = 256
+
+"""ciphertexts decrypted by one decrypt_many task in a process pool"""
+DECRYPT_BATCH = 64
+
+_worker_rsa = None
+
+# gmpy2, Crypto and the prime search / factorization modules (which import gmpy2 themselves) are imported
+# inside the functions that use them - importing rsa (and running --help) does not pay for them
+
 
 def generate_carmichael_numbers(n):
     """
     Returns list of carmichael numbers from 1 to n
+    Korselt's criterion checked on chunks of odd numbers, see carmichael module
     :param n: upper border to look for carmichael numbers
     """
-    carmichael_numbers_list = []
-
-    # composite numbers
-    # composites = [x for x in sieve(n) if x is False]
-    sieve_arr = sieve(n)
-
-    #Enumerate through numbers from 1 to n
-    for number in xrange(1, n, 2):
-        is_carmichael = True
-        # only composite numbers
-        if sieve_arr[number]:
-            continue
-
-        # get list of coprimes to number
-        list_of_coprimes = get_coprimes_range(number, 2, number - 1)
-        # if no coprimes, continue
-        if len(list_of_coprimes) == 0:
-            continue
-
-        # enumerate over coprimes
-        for coprime in list_of_coprimes:
-            #check if (coprime ** (number - 1)) mod number == 1
-            if pow(coprime, number-1, number) != 1:
-                # Break loop, not carmichael number
-                is_carmichael = False
-                break
-
-        if is_carmichael:
-            carmichael_numbers_list.append(number)
-    return carmichael_numbers_list
+    import carmichael
+    return list(carmichael.carmichael_numbers(n))
 
 
 def get_coprimes_range(n, beg, end):
@@ -81,31 +74,25 @@ def is_coprime(a, b):
 
 def is_composite(n):
     """
-    Return if number n is composite (non prime)
+    Return if number n is composite (non prime) - primality test, factors are not searched
+    (factorization.factorize finds them)
     :param n: number to check
     """
-    if n == 2:
-        return False
-
-    if n % 2 != 0:
-        f = factorize_fermat(n)
-        if f[0] == 1:
-            return False
-    return True
+    if n < 4:
+        return n == 0
+    import primality
+    return not primality.is_prime(n)
 
 
 def gcd(a, b):
     """
     return Greatest common divisor - classic euclidean algorithm
+    Iterative, with remainders instead of repeated subtraction (which is O(max(a, b)))
     :param a: first number
     :param b: second number
     """
-    while a != b:
-        if a > b:
-            a = a - b
-        else:
-            b = b - a
-    return a
+    return numbertheory.gcd(a, b)
+
 
 def gcd_mod(a, b):
     """
@@ -113,42 +100,17 @@ def gcd_mod(a, b):
     :param a: first number
     :param b: second number
     """
-    if b == 0:
-        return a
-    else:
-        return gcd(b, a % b)
+    while b != 0:
+        a, b = b, a % b
+    return a
 
 
 def gcd_bin(u, v):
     """
     https://en.wikipedia.org/wiki/Binary_GCD_algorithm
-    C recursive rewritten
+    Iterative binary gcd, see numbertheory.binary_gcd
     """
-    # simple cases (termination)
-    if u == v:
-        return u
-
-    if u == 0:
-        return v
-
-    if v == 0:
-        return u
-
-    # look for factors of 2
-    if ~u & 1: # u is even
-        if v & 1: # v is odd
-            return gcd(u >> 1, v)
-        else: # both u and v are even
-            return gcd(u >> 1, v >> 1) << 1
-
-    if ~v & 1: # u is odd, v is even
-        return gcd(u, v >> 1)
-
-    # reduce larger argument
-    if u > v:
-        return gcd((u - v) >> 1, v)
-
-    return gcd((v - u) >> 1, u)
+    return numbertheory.binary_gcd(u, v)
 
 
 def is_prime_naive(n):
@@ -190,6 +152,7 @@ def sieve_gmpy2_iter(limit):
     # Increment by 1 to account for the fact that slices  do not include
     # the last index value but we do want to include the last value for
     # calculating a list of primes.
+    import gmpy2
     sieve_limit = gmpy2.isqrt(limit) + 1
     limit += 1
 
@@ -214,14 +177,18 @@ def factorize_fermat(n):
     :param n: number to be factorized
     """
     assert n % 2 != 0 # odd numbers only
+    import gmpy2
 
-    a = math.ceil(math.sqrt(n))
+    # integer square roots - math.sqrt on floats is wrong above 2^53
+    a, remainder = gmpy2.isqrt_rem(n)
+    if remainder != 0:
+        a += 1
     b2 = a * a - n
     while not is_square(b2):
         a += 1
         b2 = a * a - n
 
-    b = math.sqrt(b2)
+    b = gmpy2.isqrt(b2)
     return int(a - b), int(a + b)
 
 
@@ -231,7 +198,8 @@ def is_square(n):
     :param n: number
     """
     # return math.sqrt(n) % 1 == 0
-    return gmpy2.isqrt(n) % 1 == 0
+    import gmpy2
+    return gmpy2.is_square(n)
 
 
 def is_prime_fermat(n, k):
@@ -247,7 +215,7 @@ def is_prime_fermat(n, k):
     if n % 2 == 0:
         return False
 
-    for _ in xrange(k):
+    for _ in range(k):
         rand_number = random.randint(1, n - 1)
         if pow(rand_number, n - 1, n) != 1:
             return False
@@ -282,11 +250,14 @@ def is_prime_miller_rabin(n, k):
 
     # test the base a to see whether it is a witness for the compositeness of n
     def try_composite(a):
-        if pow(a, d, n) == 1:
+        x = pow(a, d, n)
+        if x == 1:
             return False
+        # a ** (2 ** i * d) - square previous value instead of computing it from scratch
         for i in range(s):
-            if pow(a, 2 ** i * d, n) == n - 1:
+            if x == n - 1:
                 return False
+            x = x * x % n
         return True  # n is definitely composite
 
     for i in range(k):
@@ -304,6 +275,7 @@ def bits_in_number(number):
     """
     if number == 0:
         return 0
+    import gmpy2
     return gmpy2.mpz(gmpy2.floor(gmpy2.log2(number)) + 1)
 
 
@@ -312,53 +284,211 @@ def max_bits_in_digits(d):
     Returns maximum number of bits fitting in given number of digits eg. 2 digits (99) fits in 7 bits
     :param d: number of digits
     """
+    import gmpy2
     return gmpy2.mpz(gmpy2.ceil(d * (gmpy2.log(10) / gmpy2.log(2))))
 
 
 def rand_n_bits_number(n, even = False):
     """
-    Returning random number with n bits
+    Returning random number with n bits - drawn from buffered os.urandom, see candidates module
     :param n: number of bits to be randed
     :param even: should generated number be even (default False) or odd (default True)
     """
-    bit_array = BitArray(n)
-    bit_array.set(True, 0)
-    for i in xrange(1, n):
-        bit = random.randint(0, 1)
-        bit_array.set(bit, i)
-    if not even:
-        bit_array.set(True, n - 1)
-    return bit_array.uint
-    # return len(str(bit_array.uint)), bit_array.uint, bit_array.bin
+    import candidates
+    return candidates.rand_n_bits_number(n, even)
+
+
+def small_primes_product():
+    """
+    Returns product of all primes below primality.SMALL_PRIMES_LIMIT, computed once with segmented sieve
+    """
+    import primality
+    return primality.small_primes_product()
+
+
+def is_prime_candidate(n, k):
+    """
+    Return if number is probably prime - cheapest checks first: trial division by small primes
+    (single gcd with their product), one Miller-Rabin round with base 2, then k random Miller-Rabin rounds
+    :param n: number to be checked for primality, greater than primality.SMALL_PRIMES_LIMIT
+    :param k: number of checks in miller_rabin algorithm (None - enough for primality.DEFAULT_ERROR_BITS)
+    """
+    import gmpy2
+    import primality
+
+    if n % 2 == 0 or gmpy2.gcd(n, small_primes_product()) != 1:
+        return False
+    if not gmpy2.is_strong_prp(n, 2):
+        return False
+    return primality.miller_rabin(n, rounds=k)
+
+
+def search_prime(bits, k, attempts=None):
+    """
+    Returns random prime with given number of bits, None if not found in given number of attempts
+    :param bits: number of bits of the prime
+    :param k: number of checks in miller_rabin algorithm
+    :param attempts: number of candidates to check (default - unlimited)
+    """
+    import candidates
+
+    # is_prime_candidate does the small primes prefilter itself
+    for tried, candidate in enumerate(candidates.candidates(bits, sieved=False)):
+        if attempts is not None and tried >= attempts:
+            return None
+        if is_prime_candidate(candidate, k):
+            return candidate
+
+
+def find_primes(sizes, k, workers=None):
+    """
+    Returns list of random primes, one for every number of bits in sizes
+    Candidates are checked in batches by a pool of processes, pending batches are cancelled
+    as soon as all primes are found
+    :param sizes: list of numbers of bits
+    :param k: number of checks in miller_rabin algorithm
+    :param workers: number of processes (default - number of cpus, 1 - search in current process)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [search_prime(bits, k) for bits in sizes]
+
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    primes = [None] * len(sizes)
+    # candidates come from os.urandom in every worker, reseed only Miller-Rabin witnesses of forked processes
+    executor = ProcessPoolExecutor(workers, initializer=random.seed)
+    try:
+        pending = {}
+        while None in primes:
+            missing = [i for i, prime in enumerate(primes) if prime is None]
+            while len(pending) < workers:
+                i = missing[len(pending) % len(missing)]
+                pending[executor.submit(search_prime, sizes[i], k, PRIME_SEARCH_BATCH)] = i
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                prime = future.result()
+                if prime is not None and primes[i] is None:
+                    primes[i] = prime
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return primes
 
 
 def multiplicative_inverse(e, phi):
     """
-    https://gist.github.com/JonCooperWorks/5314103
-    Extended Euclidean - for test purposes
+    Return d such that e * d == 1 (mod phi), 0 <= d < phi - iterative extended Euclidean algorithm
+    Raises ValueError if e is not invertible modulo phi
+    """
+    return numbertheory.inverse(e, phi)
+
+
+def modulus_bytes(n):
+    """
+    Returns number of bytes needed to write modulus n
+    :param n: RSA modulus
+    """
+    return (n.bit_length() + 7) // 8
+
+
+def pad_pkcs1_type2(message, k):
+    """
+    Returns message padded to k bytes: 0x00 0x02 | nonzero random bytes | 0x00 | message
+    https://tools.ietf.org/html/rfc8017#section-7.2.1
+    :param message: bytes, at most k - 11 long
+    :param k: length of modulus in bytes
+    """
+    padding_length = k - len(message) - 3
+    assert padding_length >= 8, "message too long for given modulus"
+
+    padding = b''
+    while len(padding) < padding_length:
+        padding += os.urandom(padding_length - len(padding)).replace(b'\x00', b'')
+    return b'\x00\x02' + padding + b'\x00' + message
+
+
+def unpad_pkcs1_type2(block):
+    """
+    Returns message extracted from PKCS#1 v1.5 (type 2) padded block
+    :param block: bytes, decrypted block written on k bytes
+    """
+    separator = block.find(b'\x00', 2)
+    if block[0:2] != b'\x00\x02' or separator < 10:
+        raise ValueError("decryption error - invalid padding")
+    return block[separator + 1:]
+
+
+def emsa_pkcs1_encode(data, k):
+    """
+    Returns SHA-512 digest of data encoded to k bytes: 0x00 0x01 | 0xff bytes | 0x00 | DigestInfo | digest
+    https://tools.ietf.org/html/rfc8017#section-9.2
+    :param data: bytes to be signed
+    :param k: length of modulus in bytes
+    """
+    t = SHA512_DIGEST_INFO + hashlib.sha512(data).digest()
+    assert k >= len(t) + PKCS1_PADDING_OVERHEAD, "modulus too small for SHA-512 signature"
+    return b'\x00\x01' + b'\xff' * (k - len(t) - 3) + b'\x00' + t
+
+
+def verify_signature(public_key, signature, data, k=None):
+    """
+    Return if signature made with sign_bytes matches data - single public key exponentiation
+    :param public_key: (e, n)
+    :param signature: k bytes long signature
+    :param data: signed bytes
+    :param k: length of modulus in bytes (computed if not given)
     """
-    d = 0
-    x1 = 0
-    x2 = 1
-    y1 = 1
-    temp_phi = phi
+    e, n = public_key
+    if k is None:
+        k = modulus_bytes(n)
+    if len(signature) != k:
+        return False
+    s = int.from_bytes(signature, 'big')
+    if s >= n:
+        return False
+    import gmpy2
+    return int(gmpy2.powmod(s, e, n)).to_bytes(k, 'big') == emsa_pkcs1_encode(data, k)
 
-    while e > 0:
-        temp1 = temp_phi / e
-        temp2 = temp_phi - temp1 * e
-        temp_phi = e
-        e = temp2
 
-        x = x2 - temp1 * x1
-        y = d - temp1 * y1
+def _verify_chunk(public_key, pairs):
+    """
+    Returns list of verify_signature results for (signature, data) pairs - task of a worker process
+    """
+    k = modulus_bytes(public_key[1])
+    return [verify_signature(public_key, signature, data, k) for signature, data in pairs]
 
-        x2 = x1
-        x1 = x
-        d = y1
-        y1 = y
 
-    if temp_phi == 1:
-        return d + phi
+def _init_decrypt_worker(private_key):
+    """
+    Prepares private key state of a worker process once, for all decrypt_many chunks
+    """
+    import gmpy2
+
+    global _worker_rsa
+    _worker_rsa = RSA()
+    _worker_rsa.private_key = tuple(gmpy2.mpz(x) for x in private_key)
+
+
+def _decrypt_chunk(ciphers):
+    """
+    Returns list of decrypt_bytes results for ciphers - task of a worker process
+    """
+    return [_worker_rsa.decrypt_bytes(cipher) for cipher in ciphers]
+
+
+def crt_private_key(d, p, q):
+    """
+    Returns private key with CRT parameters: (d, n, p, q, d mod (p-1), d mod (q-1), q^-1 mod p)
+    First two items are the same as in old (d, n) private key
+    :param d: private exponent
+    :param p: first prime factor of n
+    :param q: second prime factor of n
+    """
+    import gmpy2
+    d, p, q = gmpy2.mpz(d), gmpy2.mpz(p), gmpy2.mpz(q)
+    return d, p * q, p, q, d % (p - 1), d % (q - 1), gmpy2.invert(q, p)
 
 
 class RSA:
@@ -369,24 +499,18 @@ class RSA:
         self.private_key = 0
         self.public_key = 0
 
-    def generate(self, bits, k=999):
+    def generate(self, bits, k=None, workers=None):
         """
         Return public and private key of RSA
         :param bits: minimum number of bits for p and q
-        :param k: number of checks in miller_rabin algorithm
+        :param k: number of checks in miller_rabin algorithm (default - error bound of primality.DEFAULT_ERROR_BITS)
+        :param workers: number of processes searching for p and q (default - number of cpus)
         """
-        p = q = 0
-        while True:
-            p = rand_n_bits_number(bits)
-            if is_prime_miller_rabin(p, k):
-                break
+        import gmpy2
 
         # every 24 bits, about 7 digits difference - rand between 14 and 42 digits difference
         pq_bits_difference = random.randint(48, 144)
-        while True:
-            q = rand_n_bits_number(bits + pq_bits_difference)
-            if is_prime_miller_rabin(q, k):
-                break
+        p, q = find_primes([bits, bits + pq_bits_difference], k, workers)
         n = gmpy2.mpz(p) * gmpy2.mpz(q)
         phi_n = gmpy2.mpz(p-1) * gmpy2.mpz(q-1)
 
@@ -399,40 +523,130 @@ class RSA:
             temp += 1
         assert e < phi_n
 
-        # ext = multiplicative_inverse(e, phi_n)
-        ext = gmpy2.gcdext(e, phi_n)
-        if ext[0] == 1:
-            d = phi_n + ext[1]
+        d = gmpy2.invert(e, phi_n)
         assert (d * e % phi_n == 1)
 
-        self.private_key = (d, n)
+        self.private_key = crt_private_key(d, p, q)
         self.public_key = (e, n)
 
         return self.public_key, self.private_key
 
+    def private_powmod(self, c):
+        """
+        Return c ** d mod n - private key operation, computed with Chinese remainder theorem
+        (two half-size exponentiations) when private key carries p and q
+        Old private keys in (d, n) form are still accepted and use single full-size exponentiation
+        :param c: number to be raised to private exponent
+        """
+        import gmpy2
+        if len(self.private_key) == 2:
+            return gmpy2.powmod(c, self.private_key[0], self.private_key[1])
+
+        d, n, p, q, d_p, d_q, q_inv = self.private_key
+        m_p = gmpy2.powmod(c, d_p, p)
+        m_q = gmpy2.powmod(c, d_q, q)
+        return numbertheory.garner(m_p, m_q, p, q, q_inv)
+
     def encrypt(self, text):
+        import gmpy2
         cipher = ""
         for t in text:
             cipher += str(gmpy2.powmod(ord(t), self.public_key[0], self.public_key[1])) + " "
         return cipher
 
     def decrypt(self, cipher):
+        import gmpy2
         text = ""
         cipher = cipher.split(" ")
         for c in cipher:
             if len(c) != 0:
-                text += chr(gmpy2.powmod(gmpy2.mpz(c), self.private_key[0], self.private_key[1]))
+                text += chr(self.private_powmod(gmpy2.mpz(c)))
         return text
 
+    def encrypt_bytes(self, data):
+        """
+        Return ciphertext of data - message is packed into blocks of (k - 11) bytes, k - length of modulus in bytes,
+        every block is padded (PKCS#1 v1.5, type 2), encrypted with single modexp and written on exactly k bytes
+        :param data: bytes to be encrypted
+        """
+        import gmpy2
+
+        k = modulus_bytes(self.public_key[1])
+        block_size = k - PKCS1_PADDING_OVERHEAD
+        assert block_size > 0, "modulus too small for PKCS#1 padding"
+
+        blocks = []
+        for i in range(0, max(len(data), 1), block_size):
+            block = pad_pkcs1_type2(data[i:i + block_size], k)
+            c = gmpy2.powmod(int.from_bytes(block, 'big'), self.public_key[0], self.public_key[1])
+            blocks.append(int(c).to_bytes(k, 'big'))
+        return b''.join(blocks)
+
+    def decrypt_bytes(self, cipher):
+        """
+        Return plaintext bytes of cipher produced by encrypt_bytes
+        :param cipher: bytes, concatenation of k bytes long blocks
+        """
+        k = modulus_bytes(self.private_key[1])
+        if len(cipher) % k != 0:
+            raise ValueError("ciphertext length is not a multiple of modulus length")
+
+        view = memoryview(cipher)
+        blocks = []
+        for i in range(0, len(cipher), k):
+            m = self.private_powmod(int.from_bytes(view[i:i + k], 'big'))
+            blocks.append(unpad_pkcs1_type2(int(m).to_bytes(k, 'big')))
+        return b''.join(blocks)
+
+    def decrypt_many(self, ciphers, workers=1, chunksize=DECRYPT_BATCH):
+        """
+        Yields decrypt_bytes results for every cipher, in the same order
+        Ciphers are read in chunks, a few chunks are in flight at once, so memory stays bounded for long streams
+        Private key (with CRT parameters) is sent to every worker process once
+        :param ciphers: iterable of ciphertexts produced by encrypt_bytes
+        :param workers: number of processes (default 1 - current process, None - number of cpus)
+        :param chunksize: ciphertexts in one task of a worker process
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            for cipher in ciphers:
+                yield self.decrypt_bytes(cipher)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        private_key = tuple(int(x) for x in self.private_key)
+        with ProcessPoolExecutor(workers, initializer=_init_decrypt_worker, initargs=(private_key,)) as executor:
+            pending = deque()
+            chunk = []
+            for cipher in ciphers:
+                chunk.append(cipher)
+                if len(chunk) == chunksize:
+                    pending.append(executor.submit(_decrypt_chunk, chunk))
+                    chunk = []
+                    if len(pending) >= 2 * workers:
+                        for text in pending.popleft().result():
+                            yield text
+            if chunk:
+                pending.append(executor.submit(_decrypt_chunk, chunk))
+            while pending:
+                for text in pending.popleft().result():
+                    yield text
+
     def sign(self, text):
         sign = ""
+        if isinstance(text, str):
+            text = text.encode('utf-8')
         text = hashlib.sha512(text).hexdigest()
         for t in text:
-            sign += str(gmpy2.powmod(ord(t), self.private_key[0], self.private_key[1])) + " "
+            sign += str(self.private_powmod(ord(t))) + " "
         return sign
 
     def verify_sign(self, sign, text_original):
+        import gmpy2
         text = ""
+        if isinstance(text_original, str):
+            text_original = text_original.encode('utf-8')
         sign = sign.split(" ")
         try:
             for s in sign:
@@ -442,6 +656,103 @@ class RSA:
             return False
         return text == hashlib.sha512(text_original).hexdigest()
 
+    def sign_bytes(self, data):
+        """
+        Return signature of data - SHA-512 digest encoded into one block (PKCS#1 v1.5), signed with
+        single private key exponentiation, written on k bytes
+        :param data: bytes to be signed
+        """
+        k = modulus_bytes(self.private_key[1])
+        s = self.private_powmod(int.from_bytes(emsa_pkcs1_encode(data, k), 'big'))
+        return int(s).to_bytes(k, 'big')
+
+    def verify_bytes(self, signature, data):
+        """
+        Return if signature made with sign_bytes matches data
+        :param signature: signature bytes
+        :param data: signed bytes
+        """
+        return verify_signature(self.public_key, signature, data)
+
+    def verify_many(self, pairs, workers=1, chunksize=VERIFY_BATCH):
+        """
+        Return list of verify_bytes results for every (signature, data) pair, in the same order
+        Modulus length is computed once per chunk, chunks are checked in current process or in a pool of processes
+        :param pairs: iterable of (signature, data)
+        :param workers: number of processes (default 1 - current process, None - number of cpus)
+        :param chunksize: pairs in one task of a worker process
+        """
+        pairs = list(pairs)
+        workers = workers or os.cpu_count() or 1
+        if workers == 1:
+            return _verify_chunk(self.public_key, pairs)
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        public_key = (int(self.public_key[0]), int(self.public_key[1]))
+        with ProcessPoolExecutor(workers) as executor:
+            tasks = [executor.submit(_verify_chunk, public_key, pairs[i:i + chunksize])
+                     for i in range(0, len(pairs), chunksize)]
+            return [result for task in tasks for result in task.result()]
+
+
+def benchmark_decryption(bits=1024, count=500, workers=None):
+    """
+    Prints decryptions/sec of decrypt_bytes loop and decrypt_many
+    :param bits: bits parameter of RSA.generate
+    :param count: number of ciphertexts (one block each)
+    :param workers: processes of decrypt_many (default - number of cpus)
+    """
+    rsa = RSA()
+    rsa.generate(bits)
+    messages = [os.urandom(64) for _ in range(count)]
+    ciphers = [rsa.encrypt_bytes(m) for m in messages]
+
+    start = timeit.default_timer()
+    sequential = [rsa.decrypt_bytes(c) for c in ciphers]
+    sequential_rate = count / (timeit.default_timer() - start)
+
+    start = timeit.default_timer()
+    batch = list(rsa.decrypt_many(ciphers, workers))
+    batch_rate = count / (timeit.default_timer() - start)
+    assert sequential == batch == messages
+
+    print("decrypt_bytes loop %10.1f decryptions/s" % sequential_rate)
+    print("decrypt_many       %10.1f decryptions/s" % batch_rate)
+
+
+def benchmark_signatures(bits=1024, count=200, workers=None):
+    """
+    Prints signatures/sec and verifications/sec of per-character sign/verify_sign
+    and single exponentiation sign_bytes/verify_bytes/verify_many
+    :param bits: bits parameter of RSA.generate
+    :param count: number of signed messages
+    :param workers: processes of verify_many (default - number of cpus)
+    """
+    rsa = RSA()
+    rsa.generate(bits)
+    messages = [os.urandom(256) for _ in range(count)]
+
+    def rate(function, items):
+        start = timeit.default_timer()
+        results = function(items)
+        return results, len(items) / (timeit.default_timer() - start)
+
+    old_signatures, old_sign_rate = rate(lambda items: [rsa.sign(m) for m in items], messages[:count // 10 or 1])
+    _, old_verify_rate = rate(lambda items: [rsa.verify_sign(s, m) for s, m in items],
+                              list(zip(old_signatures, messages)))
+    signatures, sign_rate = rate(lambda items: [rsa.sign_bytes(m) for m in items], messages)
+    pairs = list(zip(signatures, messages))
+    verified, verify_rate = rate(lambda items: [rsa.verify_bytes(s, m) for s, m in items], pairs)
+    verified_many, verify_many_rate = rate(lambda items: rsa.verify_many(items, workers), pairs)
+    assert all(verified) and all(verified_many)
+
+    print("sign (per character)        %10.1f signatures/s" % old_sign_rate)
+    print("sign_bytes                  %10.1f signatures/s" % sign_rate)
+    print("verify_sign (per character) %10.1f verifications/s" % old_verify_rate)
+    print("verify_bytes                %10.1f verifications/s" % verify_rate)
+    print("verify_many                 %10.1f verifications/s" % verify_many_rate)
+
 
 # num = 99999
 # print gcd(32,  64)
@@ -484,29 +795,57 @@ used to directly encrypt user data. More often, RSA passes encrypted shared keys
 which in turn can perform bulk encryption-decryption operations at much higher speed.
 '''
 
-start = timeit.default_timer()
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="RSA demo - generates keys, encrypts, decrypts, signs and verifies "
+                                                 "sample text")
+    parser.add_argument('--bits', type=int, default=1024, help='bits parameter of RSA.generate')
+    parser.add_argument('--workers', type=int, default=None, help='processes searching for primes')
+    parser.add_argument('--benchmark', choices=['decryption', 'signatures'], help='run benchmark instead of demo')
+    args = parser.parse_args(argv)
+
+    if args.benchmark == 'decryption':
+        return benchmark_decryption(args.bits, workers=args.workers)
+    if args.benchmark == 'signatures':
+        return benchmark_signatures(args.bits, workers=args.workers)
+
+    start = timeit.default_timer()
+
+    rsa = RSA()
+
+    #generate rsa keys
+    print(rsa.generate(args.bits, workers=args.workers))
+
+    #encrypt text
+    cipher = rsa.encrypt(text)
+    print(cipher)
+
+    #decrypt encrypted text
+    decrypt = rsa.decrypt(cipher)
+    print(decrypt)
 
-rsa = RSA()
+    #encrypt and decrypt text as bytes, in blocks of modulus size
+    cipher_bytes = rsa.encrypt_bytes(text.encode('utf-8'))
+    print(len(cipher_bytes), len(cipher))
+    print(rsa.decrypt_bytes(cipher_bytes).decode('utf-8') == text)
 
-#generate rsa keys
-print rsa.generate(1024, 999)
+    #sign text
+    signed = rsa.sign(text)
+    print(signed)
 
-#encrypt text
-cipher = rsa.encrypt(text)
-print cipher
+    #verify sign
+    print(rsa.verify_sign(signed, text))
+    signed = "86" + signed[2:]
+    print(rsa.verify_sign(signed, text))
 
-#decrypt encrypted text
-decrypt = rsa.decrypt(cipher)
-print decrypt
+    #sign text with single exponentiation and verify
+    signature = rsa.sign_bytes(text.encode('utf-8'))
+    print(rsa.verify_bytes(signature, text.encode('utf-8')))
 
-#sign text
-signed = rsa.sign(text)
-print signed
+    stop = timeit.default_timer()
+    print(stop - start)
 
-#verify sign
-print rsa.verify_sign(signed, text)
-signed = "86" + signed[2:]
-print rsa.verify_sign(signed, text)
 
-stop = timeit.default_timer()
-print stop - start
\ No newline at end of file
+if __name__ == '__main__':
+    main()
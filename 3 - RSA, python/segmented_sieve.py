@@ -0,0 +1,155 @@
+import gmpy2
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Segmented sieve of Eratosthenes - odd numbers only, bit-packed (gmpy2.xmpz bitmaps, bit i of a segment
+starting at odd lo stands for lo + 2i), sieved in fixed-size segments so memory stays bounded
+by segment size and base primes up to sqrt(hi)
+https://en.wikipedia.org/wiki/Sieve_of_Eratosthenes#Segmented_sieve
+"""
+
+"""odd numbers in one segment - 2 ** 18 bits, 32 KiB bitmap fits in L1/L2 cache"""
+SEGMENT_SIZE = 2 ** 18
+
+_worker_base_primes = None
+
+
+def base_primes(limit):
+    """
+    Returns list of odd primes up to limit (inclusive) - plain odd-only bitmap sieve
+    :param limit: upper border
+    """
+    limit = int(limit)
+    if limit < 3:
+        return []
+    size = (limit - 1) // 2  # bit i stands for 2i + 3
+    bitmap = gmpy2.xmpz(0)
+    for i in bitmap.iter_clear(0, (gmpy2.isqrt(limit) - 1) // 2):
+        p = 2 * i + 3
+        bitmap[(p * p - 3) // 2: size: p] = -1
+    return [2 * i + 3 for i in bitmap.iter_clear(0, size)]
+
+
+def sieve_segment(lo, hi, base):
+    """
+    Returns bitmap of odd numbers in <lo, hi) - bit i is set if lo + 2i is composite
+    :param lo: odd begin of the segment
+    :param hi: end of the segment (exclusive)
+    :param base: odd primes up to sqrt(hi)
+    """
+    size = (hi - lo + 1) // 2
+    bitmap = gmpy2.xmpz(0)
+    for p in base:
+        first = p * p
+        if first >= hi:
+            break
+        if first < lo:
+            first = (lo + p - 1) // p * p
+            if first % 2 == 0:
+                first += p
+        bitmap[(first - lo) // 2: size: p] = -1
+    return bitmap
+
+
+def segment_bounds(lo, hi, segment_size=SEGMENT_SIZE):
+    """
+    Yields (begin, end) of consecutive segments covering odd numbers in <lo, hi), lo odd
+    """
+    for begin in range(lo, hi, 2 * segment_size):
+        yield begin, min(begin + 2 * segment_size, hi)
+
+
+def segment_primes(lo, hi, base):
+    """
+    Returns list of primes in segment <lo, hi), lo odd
+    """
+    bitmap = sieve_segment(lo, hi, base)
+    return [lo + 2 * i for i in bitmap.iter_clear(0, (hi - lo + 1) // 2)]
+
+
+def _init_worker(base):
+    global _worker_base_primes
+    _worker_base_primes = base
+
+
+def _worker_segment_primes(lo, hi):
+    return segment_primes(lo, hi, _worker_base_primes)
+
+
+def _odd_range(lo, hi):
+    """
+    Returns odd begin of <lo, hi) for sieving odd numbers, base primes up to sqrt(hi)
+    """
+    lo = max(lo, 3)
+    if lo % 2 == 0:
+        lo += 1
+    return lo, base_primes(gmpy2.isqrt(max(hi - 1, 0)))
+
+
+def primes(hi, lo=0, workers=1, segment_size=SEGMENT_SIZE):
+    """
+    Yields primes from <lo, hi) in increasing order, memory bounded by segment size
+    :param hi: upper border (exclusive)
+    :param lo: lower border (inclusive)
+    :param workers: number of processes sieving consecutive segments (None - number of cpus)
+    :param segment_size: odd numbers in one segment
+    """
+    lo, hi = int(lo), int(hi)
+    if lo <= 2 < hi:
+        yield 2
+    lo, base = _odd_range(lo, hi)
+    if lo >= hi:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for begin, end in segment_bounds(lo, hi, segment_size):
+            for p in segment_primes(begin, end, base):
+                yield p
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(base,)) as executor:
+        # keep a few segments in flight, yield them in order
+        pending = deque()
+        for begin, end in segment_bounds(lo, hi, segment_size):
+            pending.append(executor.submit(_worker_segment_primes, begin, end))
+            if len(pending) >= 2 * workers:
+                for p in pending.popleft().result():
+                    yield p
+        while pending:
+            for p in pending.popleft().result():
+                yield p
+
+
+def primes_range(lo, hi, workers=1):
+    """
+    Returns list of primes from <lo, hi)
+    :param lo: lower border (inclusive)
+    :param hi: upper border (exclusive)
+    :param workers: number of processes (None - number of cpus)
+    """
+    return list(primes(hi, lo, workers))
+
+
+def count_primes(lo, hi, workers=1):
+    """
+    Returns number of primes in <lo, hi)
+    """
+    return sum(1 for _ in primes(hi, lo, workers))
+
+
+def odd_composites(hi, lo=0, segment_size=SEGMENT_SIZE):
+    """
+    Yields odd composite numbers from <lo, hi) in increasing order, memory bounded by segment size
+    :param hi: upper border (exclusive)
+    :param lo: lower border (inclusive)
+    :param segment_size: odd numbers in one segment
+    """
+    lo, hi = int(lo), int(hi)
+    lo, base = _odd_range(lo, hi)
+    for begin, end in segment_bounds(lo, hi, segment_size):
+        bitmap = sieve_segment(begin, end, base)
+        for i in bitmap.iter_set(0, (end - begin + 1) // 2):
+            yield begin + 2 * i
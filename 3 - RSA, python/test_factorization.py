@@ -0,0 +1,132 @@
+import math
+import time
+import random
+import threading
+
+import gmpy2
+import pytest
+
+import factorization
+
+"""
+factorize results, invalid inputs, time and iteration budgets and cancelling of raced methods
+"""
+
+
+def random_prime(rng, bits):
+    return int(gmpy2.next_prime(rng.getrandbits(bits) | (1 << (bits - 1))))
+
+
+def smooth_prime(rng, bits):
+    """
+    Returns prime p of at least bits bits with p - 1 = 2 * product of distinct odd primes below 1000
+    (found by p-1 method)
+    """
+    small = [int(p) for p in factorization.segmented_sieve.primes(1000)][1:]
+    while True:
+        p = 2
+        for q in rng.sample(small, len(small)):
+            if p.bit_length() >= bits:
+                break
+            p *= q
+        if gmpy2.is_prime(p + 1):
+            return p + 1
+
+
+@pytest.fixture
+def rng():
+    return random.Random(2016)
+
+
+@pytest.mark.parametrize("n", [0, -1, -15])
+def test_not_positive(n):
+    with pytest.raises(ValueError):
+        factorization.factorize(n)
+
+
+@pytest.mark.parametrize("n, factors", [
+    (1, []),
+    (2, [2]),
+    (97, [97]),
+    (2 ** 20, [2] * 20),
+    (3 ** 7 * 5 ** 2, [3] * 7 + [5] * 2),
+    (1000003 ** 3, [1000003] * 3),
+    (999983 * 1000003, [999983, 1000003]),
+])
+def test_small(n, factors):
+    assert factorization.factorize(n) == factors
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_semiprimes_and_prime_powers(rng, parallel):
+    p, q, r = random_prime(rng, 30), random_prime(rng, 36), random_prime(rng, 40)
+    for factors in ([p, q], [p, p, q], [r] * 3, [p, q, r, 7, 7]):
+        n = math.prod(factors)
+        assert factorization.factorize(n, parallel=parallel) == sorted(factors)
+
+
+def hard_semiprime(rng):
+    """
+    Returns product of two 100-bit primes - out of reach of every method in a test
+    """
+    return random_prime(rng, 100) * random_prime(rng, 101)
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_time_budget(rng, parallel):
+    n = hard_semiprime(rng) * 35
+    start = time.monotonic()
+    with pytest.raises(factorization.BudgetExceeded) as error:
+        factorization.factorize(n, time_budget=0.5, parallel=parallel)
+    assert time.monotonic() - start < 2
+    assert error.value.factors == [5, 7]
+    assert math.prod(error.value.remaining) * 35 == n
+
+
+def test_iteration_budget(rng):
+    n = hard_semiprime(rng)
+    assert factorization.pollard_rho_brent(n, max_iterations=1000) is None
+    with pytest.raises(factorization.BudgetExceeded):
+        factorization.factorize(n, max_iterations=1000)
+
+
+def test_rho_deadline(rng):
+    start = time.monotonic()
+    assert factorization.pollard_rho_brent(hard_semiprime(rng), deadline=start + 0.5) is None
+    assert time.monotonic() - start < 0.65
+
+
+def test_rho_counts_every_iteration(rng):
+    # iterations of the advance loop (as many as all the others) count too - max_iterations steps of x -> x^2 + c
+    # take at most as long as the same number of steps of the gcd batch loop
+    n = gmpy2.mpz(hard_semiprime(rng))
+    max_iterations = 1 << 19
+    x = y = q = gmpy2.mpz(rng.randrange(1, n))
+    start = time.monotonic()
+    for _ in range(max_iterations):
+        y = (y * y + 1) % n
+        q = q * abs(x - y) % n
+    steps = time.monotonic() - start
+    start = time.monotonic()
+    assert factorization.pollard_rho_brent(n, max_iterations=max_iterations) is None
+    assert time.monotonic() - start < steps
+
+
+def test_race_cancels_losers(rng):
+    p = smooth_prime(rng, 64)
+    n = p * random_prime(rng, 100)
+    pool, cancel = factorization.method_pool()
+    try:
+        for _ in range(2):
+            # find_factor waits for the losers - in a thread, so the test fails instead of hanging if they run on
+            result = []
+            thread = threading.Thread(target=lambda: result.append(
+                factorization.find_factor(gmpy2.mpz(n), pool=pool, cancel=cancel)), daemon=True)
+            thread.start()
+            thread.join(timeout=5)
+            assert result == [p]
+            assert not cancel.is_set()
+            # losing rho is stopped - every worker of the pool is free for new tasks
+            pool.map_async(time.sleep, [0.1] * len(factorization.METHODS), chunksize=1).get(timeout=2)
+    finally:
+        pool.terminate()
@@ -0,0 +1,119 @@
+import io
+import os
+import struct
+
+import pytest
+
+import hybrid
+import rsa as rsa_module
+
+"""
+Round trip of hybrid encrypted streams, rejection of damaged files and of chunk sizes over MAX_CHUNK_SIZE
+"""
+
+CHUNK = 64
+
+
+@pytest.fixture(scope='module')
+def rsa():
+    key = rsa_module.RSA()
+    key.generate(256)
+    return key
+
+
+def encrypt(rsa, data, chunk_size=CHUNK):
+    dst = io.BytesIO()
+    hybrid.encrypt_stream(rsa, io.BytesIO(data), dst, chunk_size)
+    return dst.getvalue()
+
+
+def decrypt(rsa, data):
+    dst = io.BytesIO()
+    hybrid.decrypt_stream(rsa, io.BytesIO(data), dst)
+    return dst.getvalue()
+
+
+def chunk_offsets(encrypted):
+    """
+    Returns offsets of chunk length prefixes of encrypted data
+    """
+    wrapped_length = hybrid._HEADER.unpack_from(encrypted)[4]
+    offset = hybrid._HEADER.size + wrapped_length
+    offsets = []
+    while offset < len(encrypted):
+        offsets.append(offset)
+        length = struct.unpack_from('>I', encrypted, offset)[0] & ~hybrid.LAST_CHUNK_FLAG
+        offset += 4 + length + hybrid.TAG_SIZE
+    return offsets
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 10 * CHUNK + 7])
+def test_round_trip(rsa, size):
+    data = os.urandom(size)
+    encrypted = encrypt(rsa, data)
+    assert decrypt(rsa, encrypted) == data
+    assert len(chunk_offsets(encrypted)) == max(1, -(-size // CHUNK))
+
+
+def test_files(rsa, tmp_path):
+    plain, encrypted, decrypted = (str(tmp_path / name) for name in ("plain", "encrypted", "decrypted"))
+    data = os.urandom(3 * hybrid.CHUNK_SIZE + 5)
+    with open(plain, 'wb') as f:
+        f.write(data)
+    hybrid.encrypt_file(rsa, plain, encrypted)
+    hybrid.decrypt_file(rsa, encrypted, decrypted)
+    with open(decrypted, 'rb') as f:
+        assert f.read() == data
+
+
+def test_truncated(rsa):
+    encrypted = encrypt(rsa, os.urandom(3 * CHUNK))
+    offsets = chunk_offsets(encrypted)
+    # cut inside a chunk, after a whole chunk (last chunk dropped), inside the header
+    for end in (len(encrypted) - 1, offsets[-1], offsets[1] + 10, hybrid._HEADER.size - 1):
+        with pytest.raises(ValueError):
+            decrypt(rsa, encrypted[:end])
+
+
+@pytest.mark.parametrize("position", ["header", "length", "ciphertext", "tag"])
+def test_tampered(rsa, position):
+    encrypted = bytearray(encrypt(rsa, os.urandom(2 * CHUNK)))
+    offset = chunk_offsets(encrypted)[0]
+    index = {"header": hybrid._HEADER.size - 3, "length": offset + 3, "ciphertext": offset + 4 + CHUNK // 2,
+             "tag": offset + 4 + CHUNK + 1}[position]
+    encrypted[index] ^= 1
+    with pytest.raises(ValueError):
+        decrypt(rsa, bytes(encrypted))
+
+
+def test_reordered_and_extended(rsa):
+    encrypted = encrypt(rsa, os.urandom(3 * CHUNK))
+    first, second, last = chunk_offsets(encrypted)
+    swapped = encrypted[:first] + encrypted[second:last] + encrypted[first:second] + encrypted[last:]
+    with pytest.raises(ValueError):
+        decrypt(rsa, swapped)
+    with pytest.raises(ValueError):
+        decrypt(rsa, encrypted + b'\0')
+
+
+def test_other_key(rsa):
+    other = rsa_module.RSA()
+    other.generate(256)
+    with pytest.raises(ValueError):
+        decrypt(other, encrypt(rsa, b'secret'))
+
+
+@pytest.mark.parametrize("chunk_size", [0, hybrid.MAX_CHUNK_SIZE + 1, hybrid.LAST_CHUNK_FLAG])
+def test_chunk_size_rejected(rsa, chunk_size):
+    with pytest.raises(ValueError):
+        encrypt(rsa, b'data', chunk_size)
+
+
+@pytest.mark.parametrize("chunk_size", [0, hybrid.MAX_CHUNK_SIZE + 1, 0xFFFFFFFF])
+def test_header_chunk_size_rejected(rsa, chunk_size, monkeypatch):
+    encrypted = bytearray(encrypt(rsa, b'data'))
+    struct.pack_into('>I', encrypted, 5, chunk_size)
+    # rejected before the buffer of chunk size is allocated
+    monkeypatch.setattr(hybrid, 'bytearray', lambda size: pytest.fail("buffer allocated"), raising=False)
+    with pytest.raises(ValueError, match="chunk size"):
+        decrypt(rsa, bytes(encrypted))
@@ -0,0 +1,84 @@
+import os
+import sys
+import argparse
+import subprocess
+import timeit
+
+"""
+Startup time benchmark - runs every command line entry point with --help and imports every library module
+in a fresh interpreter, prints median wall time and marks commands slower than the limit
+"""
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+"""(directory, script) pairs of command line entry points"""
+SCRIPTS = [
+    ("1 - aka X.509", "gen.py"),
+    ("1 - aka X.509", "check.py"),
+    ("1 - aka X.509", "keypool.py"),
+    ("2 - entropy, text stats", "fileStats.py"),
+    ("3 - RSA, python", "rsa.py"),
+    ("3 - RSA, python", "benchmark_suite.py"),
+]
+
+"""(directory, module) pairs of imported libraries"""
+MODULES = [
+    ("1 - aka X.509", "gen"),
+    ("1 - aka X.509", "check"),
+    ("2 - entropy, text stats", "fileStats"),
+    ("3 - RSA, python", "rsa"),
+    ("3 - RSA, python", "numbertheory"),
+]
+
+"""startup time limit in milliseconds"""
+DEFAULT_LIMIT = 100.0
+
+
+def time_command(command, cwd, repeat):
+    """
+    Returns median wall time in milliseconds of running command in a new process
+    :param command: argument list
+    :param cwd: working directory
+    :param repeat: number of runs
+    """
+    times = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((timeit.default_timer() - start) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def benchmark(repeat=11, limit=DEFAULT_LIMIT):
+    """
+    Prints startup times, returns number of commands slower than limit
+    :param repeat: runs of every command
+    :param limit: startup time limit in milliseconds
+    """
+    commands = [("python -c pass", ROOT, [sys.executable, "-c", "pass"])]
+    commands += [("%s --help" % script, os.path.join(ROOT, directory), [sys.executable, script, "--help"])
+                 for directory, script in SCRIPTS]
+    commands += [("import %s" % module, os.path.join(ROOT, directory), [sys.executable, "-c", "import " + module])
+                 for directory, module in MODULES]
+
+    slow = 0
+    for name, cwd, command in commands:
+        median = time_command(command, cwd, repeat)
+        mark = ""
+        if median > limit:
+            mark = " SLOW"
+            slow += 1
+        print("%-24s %8.1f ms%s" % (name, median, mark))
+    return slow
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure startup time of command line entry points and imports")
+    parser.add_argument('--repeat', type=int, default=11, help='runs of every command (median is reported)')
+    parser.add_argument('--limit', type=float, default=DEFAULT_LIMIT, help='startup time limit in milliseconds')
+    args = parser.parse_args(argv)
+    return 1 if benchmark(args.repeat, args.limit) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())